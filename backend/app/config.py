@@ -15,12 +15,88 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-producti
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 
-# Debug print
-print("\n ========================================")
-print(" CONFIG LOADED")
-print(" ========================================")
-print(f"GOOGLE_CLIENT_ID set: {bool(GOOGLE_CLIENT_ID)}")
-if GOOGLE_CLIENT_ID:
-    print(f"GOOGLE_CLIENT_ID preview: {GOOGLE_CLIENT_ID[:30]}...")
-print(f"JWT_SECRET_KEY set: {bool(JWT_SECRET_KEY)}")
-print(" ========================================\n")
\ No newline at end of file
+# Google ID token verification; point these at a local issuer to test without Google
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+GOOGLE_TOKEN_ISSUERS = tuple(
+    issuer.strip()
+    for issuer in os.getenv("GOOGLE_TOKEN_ISSUERS", "accounts.google.com,https://accounts.google.com").split(",")
+    if issuer.strip()
+)
+# Certs are cached for the response's Cache-Control max-age, or this long if it has none
+GOOGLE_CERTS_DEFAULT_TTL_SECONDS = float(os.getenv("GOOGLE_CERTS_DEFAULT_TTL_SECONDS", "300"))
+GOOGLE_CERTS_TIMEOUT_SECONDS = float(os.getenv("GOOGLE_CERTS_TIMEOUT_SECONDS", "10"))
+# Verified access-token payloads kept in memory until their exp (0 disables)
+JWT_PAYLOAD_CACHE_SIZE = int(os.getenv("JWT_PAYLOAD_CACHE_SIZE", "4096"))
+
+# Model cache, one per process (shared by every ModelService in it). Attack
+# workers each hold their own: MODEL_CACHE_MAX_BYTES is the total for the pool and
+# is split evenly across ATTACK_WORKERS; MODEL_CACHE_MAX_ENTRIES applies per worker
+MODEL_CACHE_MAX_ENTRIES = int(os.getenv("MODEL_CACHE_MAX_ENTRIES", "4"))
+MODEL_CACHE_MAX_BYTES = int(os.getenv("MODEL_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Trace uploaded models to TorchScript once at upload so scans skip unpickling the checkpoint
+COMPILE_MODELS_ON_UPLOAD = os.getenv("COMPILE_MODELS_ON_UPLOAD", "true").lower() in ("1", "true", "yes")
+
+# Upload size limits: request bodies above the request limits are rejected from
+# Content-Length (or once that much has arrived) before multipart parsing; each
+# file is then copied to disk in chunks and checked against its own limit
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_MODEL_UPLOAD_BYTES = int(os.getenv("MAX_MODEL_UPLOAD_BYTES", str(1024 ** 3)))
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(20 * 1024 ** 2)))
+# Whole /upload-data request, which may carry many images
+MAX_DATA_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_DATA_UPLOAD_REQUEST_BYTES", str(256 * 1024 ** 2)))
+
+# Attack pipeline
+ATTACK_BATCH_SIZE = int(os.getenv("ATTACK_BATCH_SIZE", "16"))
+MAX_SCAN_IMAGES = int(os.getenv("MAX_SCAN_IMAGES", "500"))
+# Default wall-clock budget per attack in seconds (0 = unlimited); PipelineRequest can override it
+ATTACK_TIME_BUDGET_SECONDS = float(os.getenv("ATTACK_TIME_BUDGET_SECONDS", "0"))
+# Longest budget a request may ask for; unlimited requests get this (0 = no cap)
+MAX_ATTACK_TIME_BUDGET_SECONDS = float(os.getenv("MAX_ATTACK_TIME_BUDGET_SECONDS", "3600"))
+
+# Adversarial image persistence: "png" writes PNGs in a background pool during the
+# scan; "compact" stores float16 perturbations per scan and renders PNGs on first request
+ADVERSARIAL_STORAGE = os.getenv("ADVERSARIAL_STORAGE", "png").lower()
+IMAGE_WRITER_THREADS = int(os.getenv("IMAGE_WRITER_THREADS", "2"))
+IMAGE_WRITER_MAX_PENDING = int(os.getenv("IMAGE_WRITER_MAX_PENDING", "64"))
+# Gallery thumbnails, written next to each adversarial PNG by the same background job
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "96"))
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "webp").lower()  # "webp" or "png"
+# Result and uploaded image files are never rewritten under the same name, so browsers may keep them
+STATIC_CACHE_MAX_AGE_SECONDS = int(os.getenv("STATIC_CACHE_MAX_AGE_SECONDS", str(365 * 24 * 3600)))
+
+# Content-addressed cache of per-image attack results, shared across scans
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join("cache", "attacks"))
+# Disk cap for the result cache; least recently used entries are removed beyond it (0 = unbounded)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Clean (unattacked) predictions, computed once per model and image set and shared by every attack
+CLEAN_PREDICTION_CACHE_ENABLED = os.getenv("CLEAN_PREDICTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CLEAN_PREDICTION_CACHE_DIR = os.getenv("CLEAN_PREDICTION_CACHE_DIR", os.path.join("cache", "clean"))
+CLEAN_PREDICTION_CACHE_MAX_BYTES = int(os.getenv("CLEAN_PREDICTION_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+# Attack execution engine (process pool)
+CPU_COUNT = os.cpu_count() or 1
+ATTACK_WORKERS = int(os.getenv("ATTACK_WORKERS", str(min(4, CPU_COUNT))))
+# Torch intra-op threads shared by all running attack jobs, rebalanced as jobs start and finish
+TORCH_THREAD_BUDGET = int(os.getenv("TORCH_THREAD_BUDGET", str(CPU_COUNT)))
+
+# Scan job scheduler
+MAX_CONCURRENT_SCANS = int(os.getenv("MAX_CONCURRENT_SCANS", "2"))
+MAX_SCANS_PER_USER = int(os.getenv("MAX_SCANS_PER_USER", "1"))
+
+# Security report generation (LLM)
+# The report is computed locally; the LLM only adds an optional narrative section
+REPORT_USE_LLM = os.getenv("REPORT_USE_LLM", "true").lower() in ("1", "true", "yes")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+REPORT_TIMEOUT_SECONDS = float(os.getenv("REPORT_TIMEOUT_SECONDS", "120"))
+REPORT_MAX_RETRIES = int(os.getenv("REPORT_MAX_RETRIES", "3"))
+REPORT_RETRY_BACKOFF_SECONDS = float(os.getenv("REPORT_RETRY_BACKOFF_SECONDS", "2"))
+
+# Logging: records go through a queue to a background writer thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Sampled events (per-image and per-stage records below WARNING) keep 1 in this many
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
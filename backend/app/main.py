@@ -1,16 +1,40 @@
+from app.utils.log import configure_logging
+configure_logging()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
 from app.routers import upload
 from app.routers import auth_router
+from app.routers import results
+from app.services.attack_engine import shutdown_attack_engine
+from app.services.scan_scheduler import recover_interrupted_scans, get_scan_scheduler
+from app.utils.metrics import render_metrics
+from app.utils.static import CachedStaticFiles, IMMUTABLE_UPLOAD_SUFFIXES
+from app.utils.body_limit import BodySizeLimitMiddleware, MULTIPART_OVERHEAD_BYTES
+from app.config import GOOGLE_CLIENT_ID, JWT_SECRET_KEY, MAX_MODEL_UPLOAD_BYTES, MAX_DATA_UPLOAD_REQUEST_BYTES
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+logger.info("Config loaded", extra={
+    "google_client_id_set": bool(GOOGLE_CLIENT_ID),
+    "jwt_secret_key_set": bool(JWT_SECRET_KEY),
+})
+
 app = FastAPI(
     title="VulnAI API",
     version="1.0.0",
     description="AI Model Vulnerability Scanner with User Authentication"
 )
 
+# Oversized uploads are refused before FastAPI spools them to disk; added before
+# CORS so the 413 still carries CORS headers
+app.add_middleware(BodySizeLimitMiddleware, limits={
+    "/api/v1/upload-model": MAX_MODEL_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/api/v1/upload-data": MAX_DATA_UPLOAD_REQUEST_BYTES,
+})
+
 # CORS middleware for frontend communication
 app.add_middleware(
     CORSMiddleware,
@@ -31,14 +55,29 @@ app.add_middleware(
 os.makedirs("uploads", exist_ok=True)
 os.makedirs("results", exist_ok=True)
 
-# Mount static files
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-app.mount("/results", StaticFiles(directory="results"), name="results")
+# Adversarial images are served by a route that can render compact-mode images on
+# first request; it must be registered before the /results static mount shadows it
+app.include_router(results.router, tags=["results"])
+
+# Mount static files; result files and uploaded images get unique names, so they are cached as immutable
+app.mount("/uploads", CachedStaticFiles(directory="uploads", immutable_suffixes=IMMUTABLE_UPLOAD_SUFFIXES), name="uploads")
+app.mount("/results", CachedStaticFiles(directory="results"), name="results")
 
 # Include routers
 app.include_router(auth_router.router, prefix="/api/v1", tags=["authentication"])
 app.include_router(upload.router, prefix="/api/v1", tags=["models & scans"])
 
+@app.on_event("startup")
+async def recover_scans():
+    """Fail scans and resume reports left behind by API processes that have stopped"""
+    recover_interrupted_scans()
+    get_scan_scheduler().resume_pending_reports()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    """Stop attack worker processes with the API"""
+    shutdown_attack_engine()
+
 @app.get("/")
 async def root():
     return {
@@ -57,6 +96,11 @@ async def health_check():
         "authentication": "enabled"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Per-stage latency histograms and counters in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/v1/status")
 async def api_status():
     """API status endpoint"""
@@ -67,7 +111,12 @@ async def api_status():
             "upload_model": "/api/v1/upload-model",
             "upload_data": "/api/v1/upload-data",
             "scan": "/api/v1/scan",
+            "scan_status": "/api/v1/scan/{scan_id}",
+            "scan_events": "/api/v1/scan/{scan_id}/events",
+            "scan_images": "/api/v1/scan/{scan_id}/images",
+            "scan_summary": "/api/v1/scan/{scan_id}/summary",
             "models": "/api/v1/models",
-            "images": "/api/v1/images"
+            "images": "/api/v1/images",
+            "metrics": "/metrics"
         }
     }
\ No newline at end of file
@@ -1,11 +1,18 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 class AttackConfig(BaseModel):
     """Configuration for a single adversarial attack job."""
     attack_type: str = "fgsm"
-    epsilon: float = 0.1
+    # Perturbation budget for attacks that take one (FGSM/PGD "eps"); None keeps the default
+    epsilon: Optional[float] = None
+    # Extra attack parameters, overriding the defaults (see attack_service.TUNABLE_PARAMS)
+    params: Dict[str, Any] = {}
+    # Iteration budget for iterative attacks (PGD, C&W, DeepFool)
+    max_iter: Optional[int] = None
+    # Wall-clock budget; the attack stops between batches once it is exceeded
+    time_budget_seconds: Optional[float] = None
 
 class AttackResult(BaseModel):
     """Detailed result for a single image within an attack."""
@@ -18,11 +25,24 @@ class AttackResult(BaseModel):
     confidence_adversarial: float
     attack_success: bool
     perturbation_norm: float
+    # Numeric class ids behind the "Class N" predictions (None for failed attacks)
+    original_class: Optional[int] = None
+    adversarial_class: Optional[int] = None
 
 class PipelineRequest(BaseModel):
     """The request model for launching a multi-attack pipeline."""
     model_name: str
-    attacks: List[AttackConfig]
+    # Attacks to run; empty runs the preset for `mode`
+    attacks: List[AttackConfig] = []
+    # "smoke" for a fast check, "deep" for the full audit
+    mode: str = "deep"
+    # Default wall-clock budget for attacks that don't set their own
+    time_budget_seconds: Optional[float] = None
+    # Epsilons for a robustness-curve sweep of the pipeline's FGSM/PGD attacks
+    sweep_epsilons: List[float] = []
+    # Capture a cProfile of each attack, and optionally a torch profiler trace
+    profile: bool = False
+    profile_torch: bool = False
 
 class ScanResponse(BaseModel):
     """The detailed response/result for one individual attack job."""
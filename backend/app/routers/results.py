@@ -0,0 +1,71 @@
+from fastapi import APIRouter, HTTPException, Request
+from PIL import Image
+from app.services.image_writer import load_perturbation, write_png, write_thumbnail, thumbnail_path_for, THUMBNAIL_SUBDIR
+from app.utils.static import cached_file_response
+import asyncio
+import os
+
+router = APIRouter()
+
+RESULTS_DIR = "results"
+
+def _render_lazy_image(user_results_dir: str, filename: str, filepath: str) -> bool:
+    """Render a compact-mode adversarial PNG (and its thumbnail) from its stored perturbation"""
+    from app.services.model_service import ModelService
+
+    stored = load_perturbation(user_results_dir, filename)
+    if stored is None:
+        return False
+    delta, original_path = stored
+    original = ModelService().preprocess_image(original_path).numpy()[0]
+    write_png(original + delta, filepath)
+    return True
+
+def _render_lazy_thumbnail(user_results_dir: str, filename: str) -> bool:
+    """Create a missing thumbnail from its full-size image, rendering that first if needed"""
+    filepath = os.path.join(user_results_dir, filename)
+    if os.path.isfile(filepath):
+        with Image.open(filepath) as image:
+            write_thumbnail(image.convert("RGB"), filepath)
+        return True
+    return _render_lazy_image(user_results_dir, filename, filepath)
+
+def _check_path_parts(*parts: str):
+    # Path parameters can't contain '/', but reject traversal explicitly
+    for part in parts:
+        if part != os.path.basename(part) or part == "..":
+            raise HTTPException(404, "Not Found")
+
+@router.get("/results/{user_id}/{filename}", include_in_schema=False)
+async def get_result_image(request: Request, user_id: str, filename: str):
+    """Serve an adversarial image, rendering it on first request when stored compactly"""
+    _check_path_parts(user_id, filename)
+
+    user_results_dir = os.path.join(RESULTS_DIR, user_id)
+    filepath = os.path.join(user_results_dir, filename)
+
+    if not os.path.isfile(filepath):
+        rendered = await asyncio.to_thread(_render_lazy_image, user_results_dir, filename, filepath)
+        if not rendered:
+            raise HTTPException(404, "Not Found")
+
+    return cached_file_response(request, filepath)
+
+@router.get(f"/results/{{user_id}}/{THUMBNAIL_SUBDIR}/{{filename}}", include_in_schema=False)
+async def get_result_thumbnail(request: Request, user_id: str, filename: str):
+    """Serve an adversarial image thumbnail, creating it on first request when missing"""
+    _check_path_parts(user_id, filename)
+
+    user_results_dir = os.path.join(RESULTS_DIR, user_id)
+    # Thumbnails are named after the full-size PNG
+    image_filename = os.path.splitext(filename)[0] + ".png"
+    thumbnail_path = thumbnail_path_for(os.path.join(user_results_dir, image_filename))
+    if os.path.basename(thumbnail_path) != filename:
+        raise HTTPException(404, "Not Found")
+
+    if not os.path.isfile(thumbnail_path):
+        rendered = await asyncio.to_thread(_render_lazy_thumbnail, user_results_dir, image_filename)
+        if not rendered or not os.path.isfile(thumbnail_path):
+            raise HTTPException(404, "Not Found")
+
+    return cached_file_response(request, thumbnail_path)
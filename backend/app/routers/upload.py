@@ -1,58 +1,42 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Depends
-from fastapi.responses import JSONResponse
-from app.services.model_service import ModelService
-from app.services.attack_service import AttackService
-from app.services.reporter_service import ReporterService
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Depends, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from app.services.model_service import ModelService, UploadTooLargeError, ModelValidationError, InvalidImageError
 from app.services.auth import get_current_user
-from app.models.schemas import ScanResponse
-import uuid
-from datetime import datetime
-import os
+from app.models.schemas import PipelineRequest
+from app.utils.metrics import time_stage
+from app.services.scan_store import (
+    get_scan_from_disk,
+    get_scan_status,
+    get_scan_results,
+    get_scan_results_page,
+    get_scan_columns,
+    list_scan_summaries,
+    SORTABLE_COLUMNS,
+)
+from app.services.scan_scheduler import get_scan_scheduler, COMPLETED
+from app.services.report_stats import compute_scan_summary
+from app.services.scan_events import scan_event_bus, result_event, TERMINAL_EVENTS
+from app.services.image_writer import thumbnail_url_for
+import asyncio
 import json
+import logging
+import uuid
+import numpy as np
 
-router = APIRouter()
-
-# Directory to store scan results persistently
-SCANS_DIR = "scans"
-os.makedirs(SCANS_DIR, exist_ok=True)
-
-def get_user_scans_file(user_id: str) -> str:
-    """Get the path to user's scans file"""
-    user_scans_dir = os.path.join(SCANS_DIR, user_id)
-    os.makedirs(user_scans_dir, exist_ok=True)
-    return os.path.join(user_scans_dir, "scans.json")
-
-def save_scan_to_disk(user_id: str, scan_id: str, scan_data: dict):
-    """Save scan result to disk"""
-    scans_file = get_user_scans_file(user_id)
-    
-    # Load existing scans
-    scans = {}
-    if os.path.exists(scans_file):
-        with open(scans_file, 'r') as f:
-            scans = json.load(f)
-    
-    # Add new scan
-    scans[scan_id] = scan_data
-    
-    # Save back to disk
-    with open(scans_file, 'w') as f:
-        json.dump(scans, f, indent=2)
+# Seconds between SSE keep-alive comments on an idle stream
+SSE_KEEPALIVE_SECONDS = 15
 
-def load_user_scans(user_id: str) -> dict:
-    """Load all scans for a user from disk"""
-    scans_file = get_user_scans_file(user_id)
-    
-    if not os.path.exists(scans_file):
-        return {}
-    
-    with open(scans_file, 'r') as f:
-        return json.load(f)
+def format_sse(event: dict) -> str:
+    """Encode one event in Server-Sent Events wire format"""
+    lines = []
+    if "seq" in event:
+        lines.append(f"id: {event['seq']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event)}")
+    return "\n".join(lines) + "\n\n"
 
-def get_scan_from_disk(user_id: str, scan_id: str):
-    """Get a specific scan from disk"""
-    scans = load_user_scans(user_id)
-    return scans.get(scan_id)
+router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.post("/upload-model")
 async def upload_model(
@@ -69,7 +53,8 @@ async def upload_model(
         
         # Save uploaded model to user's directory
         model_service = ModelService()
-        model_path = await model_service.save_model(file, model_name, nb_classes, current_user["user_id"])
+        with time_stage("upload_model_request"):
+            model_path = await model_service.save_model(file, model_name, nb_classes, current_user["user_id"])
         
         return JSONResponse({
             "message": "Model uploaded successfully",
@@ -79,6 +64,12 @@ async def upload_model(
             "user_id": current_user["user_id"]
         })
     
+    except HTTPException:
+        raise
+    except UploadTooLargeError as e:
+        raise HTTPException(413, str(e))
+    except ModelValidationError as e:
+        raise HTTPException(400, f"Invalid model: {str(e)}")
     except Exception as e:
         raise HTTPException(500, f"Error uploading model: {str(e)}")
 
@@ -96,7 +87,8 @@ async def upload_test_data(
         for file in files:
             if not file.content_type.startswith('image/'):
                 continue
-            file_path = await model_service.save_test_image(file, current_user["user_id"])
+            with time_stage("upload_image_request"):
+                file_path = await model_service.save_test_image(file, current_user["user_id"])
             saved_files.append(file_path)
         
         return JSONResponse({
@@ -105,6 +97,10 @@ async def upload_test_data(
             "user_id": current_user["user_id"]
         })
     
+    except UploadTooLargeError as e:
+        raise HTTPException(413, str(e))
+    except InvalidImageError as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         raise HTTPException(500, f"Error uploading data: {str(e)}")
 
@@ -149,8 +145,8 @@ async def get_full_security_report(
     try:
         user_id = current_user["user_id"]
         
-        # Load scan data from disk using your existing function
-        scan_data = get_scan_from_disk(user_id, scan_id)
+        # Only the report fields are needed, not the result rows
+        scan_data = await asyncio.to_thread(get_scan_from_disk, user_id, scan_id, False)
         
         if not scan_data:
             raise HTTPException(404, f"Scan results not found for ID: {scan_id}")
@@ -159,10 +155,11 @@ async def get_full_security_report(
         report_content = scan_data.get("full_report_markdown")
         
         if not report_content:
-            # Fallback for old scans or incomplete data
+            # Report is generated in the background after the scan completes
+            report_status = scan_data.get("report_status", "pending")
             return JSONResponse({
-                "message": "Report content not yet available for this scan.",
-                "status": "pending"
+                "message": scan_data.get("report_error") or "Report content not yet available for this scan.",
+                "status": report_status
             }, status_code=404)
 
         # Return the report as plain text (Markdown)
@@ -175,143 +172,242 @@ async def get_full_security_report(
     
 @router.post("/scan")
 async def run_vulnerability_scan(
-    model_name: str = Form(...),
-    # Removed attack_type and epsilon, as we will run all in parallel
+    pipeline: PipelineRequest,
     current_user: dict = Depends(get_current_user)
 ):
-    """Run comprehensive, parallel vulnerability scan - authenticated endpoint"""
+    """Queue a vulnerability scan of the requested attacks (or a smoke/deep preset) - authenticated endpoint"""
+    from app.services.attack_service import AttackService
+
+    try:
+        attack_specs = AttackService().resolve_pipeline(pipeline)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
     try:
         scan_id = str(uuid.uuid4())
         user_id = current_user["user_id"]
-        
-        print(f"\n Starting comprehensive scan for user: {user_id}")
-        
-        attack_service = AttackService()
-        
-        # 👈 Use the new run_all_attacks_parallel function
-        raw_results = await attack_service.run_all_attacks_parallel(
-            model_name=model_name,
-            scan_id=scan_id,
-            user_id=user_id
-        )
-        
-        # Consolidate results into a single ScanResponse
-        response = ScanResponse(
-            scan_id=scan_id,
-            status="completed",
-            results=raw_results,
-            created_at=datetime.now(),
-            message="Comprehensive vulnerability scan completed successfully across all attacks",
-            model_name=model_name, 
-            attack_type="Comprehensive (5 attacks)", 
-            epsilon=0.0 
-        )
-        
-        scan_data = {
-            "scan_id": response.scan_id,
-            "status": response.status,
-            "results": [result.dict() for result in response.results],
-            "created_at": response.created_at.isoformat(),
-            "message": response.message,
-            "model_name": model_name,
-            "model_name": model_name,
-            "attack_type": "Comprehensive (FGSM, PGD, C&W, DeepFool)",
-            "epsilon": 0.0, # Match the value used above
-            "results": [result.dict() for result in raw_results]
-        }
-        
-        # Generate the human-readable report via ReporterService
-        reporter_service = ReporterService()
-        report_markdown = await reporter_service.generate_security_report(scan_data)
+        model_name = pipeline.model_name
+        mode = "custom" if pipeline.attacks else pipeline.mode
+
+        # The scheduler runs the attacks and report in the background
+        scan_data = await get_scan_scheduler().submit(scan_id, user_id, model_name, attack_specs, mode)
+        logger.info("Scan queued", extra={"scan_id": scan_id, "user_id": user_id, "mode": mode})
 
-        scan_data["full_report_markdown"] = report_markdown
-        save_scan_to_disk(user_id, scan_id, scan_data)
-        print(f" Comprehensive scan saved to disk for user: {user_id}")
-        
-        # return JSONResponse(scan_data) # Return JSONResponse instead of Pydantic model for simplicity
         return JSONResponse({
             "scan_id": scan_id,
-            "status": "completed",
+            "status": scan_data["status"],
             "model_name": model_name,
-            "raw_results_count": len(raw_results),
-            "generated_report_preview": report_markdown[:500] + "...", # Preview the start
-            "full_report_url": f"/api/v1/report/{scan_id}" # Suggest a new endpoint
-        }) # Return JSONResponse instead of Pydantic model for simplicity
+            "mode": mode,
+            "attacks": [spec["attack_type"] for spec in attack_specs],
+            "profiling": scan_data["profiling"],
+            "status_url": f"/api/v1/scan/{scan_id}",
+            "events_url": f"/api/v1/scan/{scan_id}/events",
+            "full_report_url": f"/api/v1/report/{scan_id}"
+        }, status_code=202)
     
     except Exception as e:
-        print(f" Comprehensive scan failed: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Queueing scan failed", extra={"user_id": current_user["user_id"]})
         raise HTTPException(500, f"Error running scan: {str(e)}")
     
 
+@router.get("/scan/{scan_id}/events")
+async def stream_scan_events(
+    scan_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream per-image results of a scan as Server-Sent Events - authenticated endpoint"""
+    user_id = current_user["user_id"]
+    if await asyncio.to_thread(get_scan_status, user_id, scan_id) is None:
+        raise HTTPException(404, f"Scan results not found for ID: {scan_id}")
+
+    async def event_stream():
+        # Subscribe before replaying stored results so nothing falls in between
+        queue = scan_event_bus.subscribe(scan_id)
+        try:
+            last_seq = 0
+            for seq, result in await asyncio.to_thread(get_scan_results, scan_id):
+                last_seq = seq
+                yield format_sse(result_event(seq, result, None))
+
+            # Re-read the status: the scan may have finished while replaying
+            status, results_count = await asyncio.to_thread(get_scan_status, user_id, scan_id)
+            if status in TERMINAL_EVENTS:
+                yield format_sse({"event": status, "results_count": results_count})
+                return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event.get("seq", last_seq + 1) <= last_seq:
+                    # Already sent during the replay
+                    continue
+                yield format_sse(event)
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            scan_event_bus.unsubscribe(scan_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Named get_scan so it doesn't shadow scan_store.get_scan_results, which the event stream replays from
 @router.get("/scan/{scan_id}")
-async def get_scan_results(
+async def get_scan(
     scan_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """Get scan results - authenticated endpoint with user isolation"""
     try:
         user_id = current_user["user_id"]
-        
-        print(f" Fetching scan {scan_id} for user: {user_id}")
-        
-        # Load from disk
-        scan_data = get_scan_from_disk(user_id, scan_id)
+
+        # SQLite reads run off the event loop; a writer holding the lock would stall it
+        scan_data = await asyncio.to_thread(get_scan_from_disk, user_id, scan_id)
         
         if not scan_data:
             raise HTTPException(404, f"Scan results not found for ID: {scan_id}")
-        
-        print(f" Scan data loaded from disk")
+        # Which API process runs the scan is internal bookkeeping for restart recovery
+        scan_data.pop("owner", None)
+
         return JSONResponse(scan_data)
     
     except HTTPException:
         raise
     except Exception as e:
-        print(f" Error retrieving results: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error retrieving results", extra={"scan_id": scan_id})
         raise HTTPException(500, f"Error retrieving results: {str(e)}")
 
-@router.get("/scans")
-async def get_user_scans(current_user: dict = Depends(get_current_user)):
-    """Get all scans for authenticated user"""
+@router.get("/scan/{scan_id}/images")
+async def get_scan_images(
+    scan_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    attack_type: str = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a page of a scan's adversarial images with thumbnail URLs, for the gallery"""
     try:
         user_id = current_user["user_id"]
-        
-        print(f" Fetching all scans for user: {user_id}")
-        
-        # Load from disk
-        scans = load_user_scans(user_id)
-        
-        if not scans:
-            print(f"No scans found for user: {user_id}")
-            return JSONResponse({"scans": [], "count": 0})
-        
-        # Format response
-        scan_list = []
-        for scan_id, scan_data in scans.items():
-            scan_list.append({
-                "scan_id": scan_id,
-                "status": scan_data.get("status", "completed"),
-                "created_at": scan_data.get("created_at"),
-                "results_count": len(scan_data.get("results", [])),
-                "model_name": scan_data.get("model_name"),
-                "attack_type": scan_data.get("attack_type")
+        if await asyncio.to_thread(get_scan_status, user_id, scan_id) is None:
+            raise HTTPException(404, f"Scan not found: {scan_id}")
+
+        total, rows = await asyncio.to_thread(
+            get_scan_results_page, scan_id, limit=limit, offset=offset, attack_type=attack_type
+        )
+        images = []
+        for seq, result in rows:
+            image_url = result.get("adversarial_image_path")
+            has_image = bool(image_url) and image_url.startswith("/results/")
+            images.append({
+                "seq": seq,
+                "attack_type": result.get("attack_type"),
+                "attack_success": result.get("attack_success"),
+                "original_prediction": result.get("original_prediction"),
+                "adversarial_prediction": result.get("adversarial_prediction"),
+                "perturbation_norm": result.get("perturbation_norm"),
+                "original_image_path": result.get("original_image_path"),
+                "image_url": image_url if has_image else None,
+                "thumbnail_url": thumbnail_url_for(image_url) if has_image else None,
             })
+
+        return JSONResponse({
+            "scan_id": scan_id,
+            "images": images,
+            "count": len(images),
+            "total": total,
+            "limit": limit,
+            "offset": offset
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error retrieving scan images", extra={"scan_id": scan_id})
+        raise HTTPException(500, f"Error retrieving scan images: {str(e)}")
+
+@router.get("/scan/{scan_id}/summary")
+async def get_scan_summary(
+    scan_id: str,
+    attack_type: str = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Aggregate ASR, norm percentiles and confusion pairs for a scan, computed over its result columns"""
+    try:
+        user_id = current_user["user_id"]
+        scan_status = await asyncio.to_thread(get_scan_status, user_id, scan_id)
+        if scan_status is None:
+            raise HTTPException(404, f"Scan not found: {scan_id}")
+        status, results_count = scan_status
+
+        def summarize():
+            columns = get_scan_columns(scan_id, final=(status == COMPLETED))
+            if not attack_type:
+                return compute_scan_summary(columns)
+            if attack_type in columns.attack_names:
+                selected = columns.attack_id == columns.attack_names.index(attack_type)
+            elif any(failed["attack_type"] == attack_type for failed in columns.failed_attacks):
+                # Ran but failed: no result rows, only its failed_attacks entry
+                selected = np.zeros(len(columns), dtype=bool)
+            else:
+                return None
+            summary = compute_scan_summary(columns.select(selected))
+            summary["attacks"] = [a for a in summary["attacks"] if a["attack_type"] == attack_type]
+            summary["failed_attacks"] = [f for f in summary["failed_attacks"] if f["attack_type"] == attack_type]
+            return summary
+
+        summary = await asyncio.to_thread(summarize)
+        if summary is None:
+            raise HTTPException(404, f"Attack {attack_type} did not run in scan {scan_id}")
+
+        return JSONResponse({
+            "scan_id": scan_id,
+            "status": status,
+            "results_count": results_count,
+            "attack_type": attack_type,
+            **summary
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error summarizing scan", extra={"scan_id": scan_id})
+        raise HTTPException(500, f"Error summarizing scan: {str(e)}")
+
+@router.get("/scans")
+async def get_user_scans(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    sort_by: str = Query("created_at"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a page of scan summaries for authenticated user"""
+    try:
+        user_id = current_user["user_id"]
+
+        if sort_by not in SORTABLE_COLUMNS:
+            raise HTTPException(400, f"sort_by must be one of: {', '.join(SORTABLE_COLUMNS)}")
         
-        # Sort by creation date (newest first)
-        scan_list.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        
-        print(f" Found {len(scan_list)} scans for user: {user_id}")
-        
+        # Summaries come from the index table; full results are never parsed here
+        scan_list, total = await asyncio.to_thread(
+            list_scan_summaries, user_id, limit=limit, offset=offset, sort_by=sort_by, descending=(order == "desc")
+        )
+
         return JSONResponse({
             "scans": scan_list,
-            "count": len(scan_list)
+            "count": len(scan_list),
+            "total": total,
+            "limit": limit,
+            "offset": offset
         })
     
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f" Error retrieving scans: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(500, f"Error retrieving scans: {str(e)}")
\ No newline at end of file
+        logger.exception("Error retrieving scans")
+        raise HTTPException(500, f"Error retrieving scans: {str(e)}")
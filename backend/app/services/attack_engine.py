@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+import uuid
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.config import ATTACK_WORKERS, TORCH_THREAD_BUDGET, MODEL_CACHE_MAX_BYTES
+from app.services.thread_budget import ThreadBudget
+from app.utils.metrics import collect_timings, observe_samples
+from app.services.profiling import profile_job
+from app.utils.log import configure_logging, log_context
+
+# How long to wait for a worker's queued events to be drained after its job returns
+EVENT_DRAIN_TIMEOUT_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+# Per-worker state. Each worker process keeps its own AttackService, and
+# therefore its own model cache with a share of the byte cap, for the lifetime
+# of the pool.
+_worker_attack_service = None
+_worker_event_queue = None
+_worker_thread_budget = None
+
+
+def _init_worker(total_threads: int, active_jobs, event_queue, workers: int):
+    """Join the shared thread budget so concurrent workers don't oversubscribe the CPU"""
+    global _worker_event_queue, _worker_thread_budget
+    import torch
+    from app.services.model_cache import model_cache
+
+    configure_logging()
+    # MODEL_CACHE_MAX_BYTES bounds the whole pool, not each worker
+    model_cache.max_bytes = MODEL_CACHE_MAX_BYTES // workers
+    _worker_event_queue = event_queue
+    _worker_thread_budget = ThreadBudget(total_threads, active_jobs)
+    # Jobs parallelize within ops; the budget sizes the intra-op pool per job
+    torch.set_num_threads(1)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Interop threads can only be set once per process
+        pass
+
+
+def _get_worker_attack_service():
+    global _worker_attack_service
+    from app.services.attack_service import AttackService
+
+    if _worker_attack_service is None:
+        _worker_attack_service = AttackService()
+    return _worker_attack_service
+
+
+def _run_clean_inference_in_worker(model_name: str, user_id: str) -> tuple:
+    """Scan-level clean forward pass, executed inside a worker process; returns (images, timing samples)"""
+    with collect_timings() as samples, _worker_thread_budget.job():
+        images = _get_worker_attack_service().compute_clean_predictions(model_name, user_id)
+    return images, samples
+
+
+def _run_sweep_in_worker(model_name: str, user_id: str, attack_spec: dict) -> dict:
+    """Epsilon sweep for one attack spec, executed inside a worker process"""
+    attack_service = _get_worker_attack_service()
+    with collect_timings() as samples, _worker_thread_budget.job() as usage:
+        attack_service.thread_usage = usage
+        try:
+            curve = attack_service.run_epsilon_sweep(model_name, user_id, attack_spec)
+        finally:
+            attack_service.thread_usage = None
+    curve["torch_threads"] = usage.summary()
+    # Popped by the parent, which replays them into its metrics
+    curve["timing_samples"] = samples
+    return curve
+
+
+def _make_results_sender(job_id: str, scan_id: str, user_id: str, attack_name: str):
+    """on_results callback that forwards each group of results to the parent through the event queue"""
+    def send(results, elapsed_seconds):
+        _worker_event_queue.put({
+            "type": "results",
+            "job_id": job_id,
+            "scan_id": scan_id,
+            "user_id": user_id,
+            "attack_type": attack_name,
+            "elapsed_seconds": elapsed_seconds,
+            "results": [result.dict() for result in results],
+        })
+    return send
+
+
+def _run_attack_in_worker(job_id: str, attack_name: str, model_name: str, scan_id: str, user_id: str, stream: bool, attack_spec: dict):
+    """Entry point executed inside a worker process"""
+    attack_service = _get_worker_attack_service()
+
+    on_results = _make_results_sender(job_id, scan_id, user_id, attack_name) if stream else None
+
+    # Profiling is opt-in per scan; without it the attack runs unwrapped
+    profilers = (attack_spec or {}).get("profile")
+    profiler = nullcontext() if not profilers else profile_job(
+        attack_service._get_user_results_dir(user_id), user_id, f"{scan_id}_{attack_name}", profilers
+    )
+
+    try:
+        with log_context(scan_id=scan_id, user_id=user_id), collect_timings() as samples, \
+                _worker_thread_budget.job() as usage:
+            # run_attack rebalances torch threads through this between batches
+            attack_service.thread_usage = usage
+            with profiler as profile_artifacts:
+                results, attack_status = attack_service.run_attack(
+                    attack_name, model_name, scan_id, user_id, on_results=on_results, attack_spec=attack_spec
+                )
+    finally:
+        attack_service.thread_usage = None
+        if stream:
+            # Queued after every result event, so the parent knows the stream is drained
+            _worker_event_queue.put({"type": "done", "job_id": job_id})
+
+    attack_status["results_count"] = len(results)
+    attack_status["torch_threads"] = usage.summary()
+    if profile_artifacts:
+        attack_status["profile"] = profile_artifacts
+    # Popped by the parent, which replays them into its metrics
+    attack_status["timing_samples"] = samples
+    # Streamed results already reached the parent; don't pickle them back again
+    return attack_status if stream else (results, attack_status)
+
+
+class AttackEngine:
+    """
+    Runs CPU-bound attacks on a process pool so they neither serialize nor block the event loop.
+
+    Streaming jobs push their results onto a multiprocessing queue; a pump
+    thread in the API process hands each event to `event_handler`.
+    """
+
+    def __init__(self, max_workers: int = ATTACK_WORKERS, thread_budget: int = TORCH_THREAD_BUDGET):
+        self.max_workers = max(1, max_workers)
+        self.thread_budget = max(1, thread_budget)
+        self.event_handler = None
+        self._executor = None
+        self._ctx = multiprocessing.get_context("spawn")
+        # Attack jobs currently running across all workers, for the thread budget
+        self._active_jobs = self._ctx.Value("i", 0)
+        self._event_queue = None
+        self._pump_thread = None
+        self._pending_jobs = {}  # job_id -> (loop, asyncio.Event)
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._event_queue is None:
+                self._event_queue = self._ctx.Queue()
+                self._pump_thread = threading.Thread(
+                    target=self._pump_events, name="attack-event-pump", daemon=True
+                )
+                self._pump_thread.start()
+            if self._executor is None:
+                # "spawn" avoids forking a parent that may already hold torch/OpenMP threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=self._ctx,
+                    initializer=_init_worker,
+                    initargs=(self.thread_budget, self._active_jobs, self._event_queue, self.max_workers),
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                # A crashed worker can't decrement its job; start the next pool from zero
+                self._active_jobs = self._ctx.Value("i", 0)
+
+    def allocation(self) -> dict:
+        """How the engine divides CPU among attack jobs, for scan metadata"""
+        return {"total_threads": self.thread_budget, "max_workers": self.max_workers}
+
+    def _pump_events(self):
+        """Forward worker events to the handler; runs on a dedicated thread"""
+        while True:
+            event = self._event_queue.get()
+            if event is None:
+                break
+            if event["type"] == "done":
+                pending = self._pending_jobs.get(event["job_id"])
+                if pending is not None:
+                    loop, drained = pending
+                    loop.call_soon_threadsafe(drained.set)
+                continue
+            if self.event_handler is not None:
+                try:
+                    self.event_handler(event)
+                except Exception:
+                    logger.exception("Attack event handler failed")
+
+    async def run_clean_inference(self, model_name: str, user_id: str) -> int:
+        """Compute and cache clean predictions for the user's test images in a worker process"""
+        loop = asyncio.get_running_loop()
+        try:
+            images, samples = await loop.run_in_executor(
+                self._get_executor(), _run_clean_inference_in_worker, model_name, user_id
+            )
+            observe_samples(samples)
+            return images
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise
+
+    async def run_epsilon_sweep(self, model_name: str, user_id: str, attack_spec: dict) -> dict:
+        """Compute one attack's robustness curve in a worker process"""
+        loop = asyncio.get_running_loop()
+        try:
+            curve = await loop.run_in_executor(
+                self._get_executor(), _run_sweep_in_worker, model_name, user_id, attack_spec
+            )
+            observe_samples(curve.pop("timing_samples"))
+            return curve
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise
+
+    async def run_attack(self, attack_name: str, model_name: str, scan_id: str, user_id: str, stream: bool = False, attack_spec: dict = None):
+        """
+        Run one attack in a worker process, with attack_spec's params and time budget.
+
+        Returns (list of AttackResult, attack_status), or with stream=True just
+        the attack_status, once every streamed event has been handled.
+        """
+        loop = asyncio.get_running_loop()
+        job_id = uuid.uuid4().hex
+        drained = asyncio.Event()
+        if stream:
+            self._pending_jobs[job_id] = (loop, drained)
+
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(), _run_attack_in_worker,
+                job_id, attack_name, model_name, scan_id, user_id, stream, attack_spec
+            )
+            attack_status = result if stream else result[1]
+            observe_samples(attack_status.pop("timing_samples"))
+            if stream:
+                try:
+                    await asyncio.wait_for(drained.wait(), timeout=EVENT_DRAIN_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    logger.warning("Timed out draining attack events", extra={"attack_type": attack_name, "scan_id": scan_id})
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool for subsequent jobs
+            self._reset_executor()
+            raise
+        finally:
+            self._pending_jobs.pop(job_id, None)
+
+    def shutdown(self):
+        self._reset_executor()
+        with self._lock:
+            if self._event_queue is not None:
+                self._event_queue.put(None)
+                self._pump_thread.join(timeout=5)
+                self._event_queue = None
+                self._pump_thread = None
+
+
+_engine = None
+
+
+def get_attack_engine() -> AttackEngine:
+    """Return the process-wide attack engine"""
+    global _engine
+    if _engine is None:
+        _engine = AttackEngine()
+    return _engine
+
+
+def shutdown_attack_engine():
+    if _engine is not None:
+        _engine.shutdown()
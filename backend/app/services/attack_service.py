@@ -3,23 +3,116 @@ import numpy as np
 from art.attacks.evasion import FastGradientMethod, ProjectedGradientDescent, CarliniL2Method,DeepFool
 from art.estimators.classification import PyTorchClassifier
 from app.services.model_service import ModelService
-from app.models.schemas import AttackResult
+from app.models.schemas import AttackResult, AttackConfig, PipelineRequest
+from app.services.attack_engine import get_attack_engine
+from app.services.result_cache import AttackResultCache, CleanPredictionCache, METRIC_FIELDS
+from app.services.image_writer import AdversarialImageWriter, PerturbationArchive, archive_path_for, write_png
+from app.services.robustness_sweep import SWEEPABLE_ATTACKS, validate_sweep_params, epsilon_sweep
+from app.utils.metrics import time_stage
+from app.services.profiling import profilers_for
+from app.config import (
+    ATTACK_BATCH_SIZE, MAX_SCAN_IMAGES, ADVERSARIAL_STORAGE, ATTACK_TIME_BUDGET_SECONDS, MAX_ATTACK_TIME_BUDGET_SECONDS,
+)
 import os
-from PIL import Image
-import torchvision.transforms as transforms
 import uuid
 import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Attacks run for PipelineRequest.mode when the request lists none
+PIPELINE_MODES = {
+    # Quick signal: single-step FGSM plus a short, time-boxed PGD
+    "smoke": [
+        {"attack_type": "fgsm"},
+        {"attack_type": "pgd", "max_iter": 10, "time_budget_seconds": 60},
+    ],
+    # Full audit with every attack at its default strength
+    "deep": [
+        {"attack_type": "fgsm"},
+        {"attack_type": "pgd"},
+        {"attack_type": "c_and_w"},
+        {"attack_type": "deepfool"},
+    ],
+}
+
+# Parameters a pipeline request may override, per attack, as (type, min, max).
+# Everything else (batch_size, targeted, verbose, summary_writer, ...) stays at
+# the server's defaults: the scan relies on untargeted attacks against the clean
+# labels, and unbounded values would tie up a worker.
+TUNABLE_PARAMS = {
+    "fgsm": {"eps": (float, 1e-6, 1.0), "norm": ("norm", None, None)},
+    "pgd": {
+        "eps": (float, 1e-6, 1.0), "eps_step": (float, 1e-6, 1.0), "max_iter": (int, 1, 1000),
+        "norm": ("norm", None, None), "num_random_init": (int, 0, 10),
+    },
+    "c_and_w": {
+        "confidence": (float, 0.0, 100.0), "learning_rate": (float, 1e-6, 1.0), "max_iter": (int, 1, 1000),
+        "binary_search_steps": (int, 1, 20), "initial_const": (float, 1e-6, 1e4),
+    },
+    "deepfool": {"max_iter": (int, 1, 1000), "epsilon": (float, 1e-9, 1.0), "nb_grads": (int, 1, 100)},
+}
+# Norms accepted for "norm"; JSON has no infinity, so L-inf is spelled "inf"
+ALLOWED_NORMS = ("inf", 1, 2)
+
+# Per-attack outcomes recorded in the scan's "attack_status"
+ATTACK_COMPLETED = "completed"
+ATTACK_PARTIAL = "partial"
+ATTACK_FAILED = "failed"
+
+
+def validate_attack_param(attack_name: str, key: str, value):
+    """Return value if `key` may be set to it for this attack, else raise ValueError"""
+    limits = TUNABLE_PARAMS[attack_name]
+    if key not in limits:
+        raise ValueError(f"Attack '{attack_name}' does not accept '{key}'. Tunable: {', '.join(limits)}")
+    kind, low, high = limits[key]
+    if kind == "norm":
+        if isinstance(value, bool) or value not in ALLOWED_NORMS:
+            raise ValueError(f"{attack_name} {key} must be one of: {', '.join(map(str, ALLOWED_NORMS))}")
+        return value
+    # bool is an int subclass, but True is not an iteration count
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and not isinstance(value, int)):
+        raise ValueError(f"{attack_name} {key} must be {'an integer' if kind is int else 'a number'}")
+    if not low <= value <= high:
+        raise ValueError(f"{attack_name} {key} must be between {low:g} and {high:g}")
+    return kind(value)
+
+
+def budget_batch_size(remaining_seconds: float, per_image_seconds: float = None) -> int:
+    """
+    Images to attack next under a time budget: 0 once the next image isn't
+    expected to fit, one image until the per-image time has been measured,
+    then as many as fit in what remains, up to ATTACK_BATCH_SIZE.
+    """
+    if remaining_seconds <= 0:
+        return 0
+    if per_image_seconds is None:
+        return 1
+    if per_image_seconds > remaining_seconds:
+        return 0
+    return max(1, min(ATTACK_BATCH_SIZE, int(remaining_seconds / per_image_seconds)))
+
 
 class AttackService:
     def __init__(self):
         self.model_service = ModelService()
+        self.result_cache = AttackResultCache()
+        self.clean_cache = CleanPredictionCache()
+        self.image_writer = AdversarialImageWriter()
+        self.compact_storage = ADVERSARIAL_STORAGE == "compact"
+        self._pending_writes = []
+        self._archive = None
+        # Set by the engine worker: rebalances torch threads against the shared budget
+        self.thread_usage = None
         self.results_dir = "results"
         os.makedirs(self.results_dir, exist_ok=True)
         self.ATTACKS = {
-            "fgsm": (FastGradientMethod, {"eps": 0.1}),
-            "pgd": (ProjectedGradientDescent, {"eps": 0.3, "eps_step": 0.01, "max_iter": 40}),
-            "c_and_w": (CarliniL2Method, {"confidence": 0.0, "max_iter": 100, "batch_size": 1}),
-            "deepfool": (DeepFool, {"max_iter": 50, "epsilon": 1e-6, "nb_grads": 1, "batch_size": 1}),
+            "fgsm": (FastGradientMethod, {"eps": 0.1, "batch_size": ATTACK_BATCH_SIZE}),
+            "pgd": (ProjectedGradientDescent, {"eps": 0.3, "eps_step": 0.01, "max_iter": 40, "batch_size": ATTACK_BATCH_SIZE}),
+            "c_and_w": (CarliniL2Method, {"confidence": 0.0, "max_iter": 100, "batch_size": ATTACK_BATCH_SIZE}),
+            "deepfool": (DeepFool, {"max_iter": 50, "epsilon": 1e-6, "nb_grads": 1, "batch_size": ATTACK_BATCH_SIZE}),
         }
     
     # Function to create a classifier dynamically
@@ -35,45 +128,209 @@ class AttackService:
             clip_values=(0.0, 1.0), # Important for many attacks (normalized images are in [0, 1])
         )
 
-    # 👈 New: Function to run a single attack for parallel execution
-    async def _run_single_attack_task(self, attack_name: str, model_name: str, scan_id: str, user_id: str):
-        """Task to run one specific adversarial attack."""
-        print(f" Starting {attack_name.upper()} attack...")
+    def resolve_pipeline(self, pipeline: PipelineRequest) -> list:
+        """
+        Validate a PipelineRequest into attack specs for the engine.
+
+        Only the parameters in TUNABLE_PARAMS can be overridden, within their
+        bounds, and every budget is capped at MAX_ATTACK_TIME_BUDGET_SECONDS.
+
+        Each spec is a plain dict {"attack_type", "params", "time_budget_seconds"},
+        plus "sweep_epsilons" for FGSM/PGD when a sweep is requested and
+        "profile" (a list of profilers) when profiling is on, so it can
+        be stored with the scan and sent to worker processes. Raises ValueError
+        for unknown modes, attacks or parameters, and out-of-range values.
+        """
+        if any(eps <= 0 for eps in pipeline.sweep_epsilons):
+            raise ValueError("sweep_epsilons must all be positive")
+
+        if pipeline.attacks:
+            configs = pipeline.attacks
+        elif pipeline.mode in PIPELINE_MODES:
+            configs = [AttackConfig(**config) for config in PIPELINE_MODES[pipeline.mode]]
+        else:
+            raise ValueError(f"Unknown scan mode '{pipeline.mode}'. Choose one of: {', '.join(PIPELINE_MODES)}")
+
+        specs = []
+        for config in configs:
+            attack_name = config.attack_type.lower()
+            if attack_name not in self.ATTACKS:
+                raise ValueError(f"Unknown attack '{config.attack_type}'. Choose one of: {', '.join(self.ATTACKS)}")
+            if any(spec["attack_type"] == attack_name for spec in specs):
+                raise ValueError(f"Attack '{attack_name}' is listed more than once")
+
+            attack_class, default_params = self.ATTACKS[attack_name]
+            overrides = dict(config.params)
+            if config.epsilon is not None:
+                overrides["eps"] = config.epsilon
+            if config.max_iter is not None:
+                overrides["max_iter"] = config.max_iter
+            overrides = {key: validate_attack_param(attack_name, key, value) for key, value in overrides.items()}
+
+            time_budget = config.time_budget_seconds
+            if time_budget is None:
+                time_budget = pipeline.time_budget_seconds
+            if time_budget is None:
+                time_budget = ATTACK_TIME_BUDGET_SECONDS
+            if time_budget < 0:
+                raise ValueError("time_budget_seconds must not be negative")
+            if MAX_ATTACK_TIME_BUDGET_SECONDS:
+                if time_budget > MAX_ATTACK_TIME_BUDGET_SECONDS:
+                    raise ValueError(f"time_budget_seconds must not exceed {MAX_ATTACK_TIME_BUDGET_SECONDS:g}")
+                # Unlimited requests still stop at the server's cap
+                time_budget = time_budget or MAX_ATTACK_TIME_BUDGET_SECONDS
+
+            specs.append({
+                "attack_type": attack_name,
+                "params": {**default_params, **overrides},
+                # 0/None means unlimited
+                "time_budget_seconds": time_budget or None,
+            })
+            profilers = profilers_for(pipeline.profile, pipeline.profile_torch)
+            if profilers:
+                specs[-1]["profile"] = profilers
+            if pipeline.sweep_epsilons and attack_name in SWEEPABLE_ATTACKS:
+                validate_sweep_params(attack_name, specs[-1]["params"])
+                specs[-1]["sweep_epsilons"] = sorted(set(pipeline.sweep_epsilons))
+
+        if pipeline.sweep_epsilons and not any("sweep_epsilons" in spec for spec in specs):
+            raise ValueError(f"sweep_epsilons needs one of these attacks in the pipeline: {', '.join(SWEEPABLE_ATTACKS)}")
+        return specs
+
+    # Runs synchronously inside an AttackEngine worker process
+    def run_attack(self, attack_name: str, model_name: str, scan_id: str, user_id: str, on_results=None, attack_spec: dict = None):
+        """
+        Run one specific adversarial attack.
+
+        attack_spec, from resolve_pipeline, overrides the default params and sets
+        a wall-clock budget. With a budget, the first batch is a single image and
+        later batches are sized from the measured per-image time to fit what is
+        left. The attack stops once the next image isn't expected to fit, and the
+        remaining images are left unattacked. A running batch can't be
+        interrupted, so the budget can be overrun by about one image's time;
+        attack_status reports that as budget_overrun_seconds.
+
+        on_results, if given, is called as (results, elapsed_seconds) for every
+        group of results as soon as it is ready (cache hits, then each batch).
+
+        Returns (results, attack_status).
+        """
+        logger.info("Attack started", extra={"attack_type": attack_name})
+        attack_start = time.perf_counter()
+        attack_class, params = self.ATTACKS[attack_name.lower()]
+        time_budget = None
+        if attack_spec is not None:
+            params = attack_spec["params"]
+            time_budget = attack_spec["time_budget_seconds"]
         
         try:
-            # 1. Load model and metadata
-            model, metadata = self.model_service.load_model(model_name, user_id)
+            # 1. Read metadata and get preprocessed test images as a single (N, 3, 224, 224) array
+            metadata = self.model_service.get_model_metadata(model_name, user_id)
             nb_classes = metadata['nb_classes']
 
-            # 2. Create ART classifier dynamically
-            classifier = self._create_classifier(model, nb_classes)
-            
-            # 3. Create attack instance
-            attack_class, params = self.ATTACKS[attack_name.lower()]
-            
-            attack = attack_class(classifier, **params)
-
-            # 4. Get test images
-            test_images = self._get_test_images(user_id)
+            test_images, image_hashes, images_np = self.model_service.load_test_tensors(user_id, MAX_SCAN_IMAGES)
             if not test_images:
                 raise ValueError("No test images found. Please upload images first.")
-            
-            attack_results = []
-            
-            # Limit to 5 images for demo, but run attack per image
-            for img_path in test_images[:5]:
-                result = await self._attack_single_image(
-                    img_path, attack, classifier, scan_id, user_id, attack_name
+
+            # 2. Serve results already computed for these exact model/image bytes
+            model_hash = self.model_service.get_model_hash(model_name, user_id)
+            cache_keys = [
+                self.result_cache.make_key(model_hash, image_hash, attack_name, params, nb_classes)
+                for image_hash in image_hashes
+            ]
+            attack_results = [None] * len(test_images)
+            misses = []
+            skipped = 0
+            self._pending_writes = []
+            self._archive = PerturbationArchive() if self.compact_storage else None
+            with time_stage("cache_lookup", attack_name):
+                entries = self.result_cache.get_many(cache_keys)
+            for i, entry in enumerate(entries):
+                if entry is None:
+                    misses.append(i)
+                else:
+                    attack_results[i] = self._result_from_cache(
+                        entry, test_images[i], images_np[i], scan_id, user_id, attack_name
+                    )
+
+            # Each group of results is emitted one step late, once its images are on
+            # disk, so PNG encoding of one batch overlaps the next batch's attack.
+            pending_group = None
+            if len(misses) < len(test_images):
+                pending_group = (
+                    [r for r in attack_results if r is not None],
+                    self._take_pending_writes(),
+                    time.perf_counter() - attack_start,
                 )
-                attack_results.append(result)
-            
-            print(f" {attack_name.upper()} attack completed with {len(attack_results)} results.")
-            return attack_results
+
+            if misses:
+                # 3. Load model, create ART classifier and attack only when something must be computed
+                model, _ = self.model_service.load_model(model_name, user_id)
+                classifier = self._create_classifier(model, nb_classes)
+                attack = attack_class(classifier, **params)
+
+                # Clean predictions come from the scan-level stage, so every attack
+                # uses the same labels and baseline confidences
+                clean_pred = self._clean_predictions(model_hash, image_hashes, images_np, classifier)
+
+                # 4. Run generate/predict over mini-batches of the cache misses
+                start = 0
+                per_image_seconds = None
+                while start < len(misses):
+                    batch_size = ATTACK_BATCH_SIZE
+                    if time_budget:
+                        remaining = time_budget - (time.perf_counter() - attack_start)
+                        batch_size = budget_batch_size(remaining, per_image_seconds)
+                        if batch_size == 0:
+                            skipped = len(misses) - start
+                            logger.warning("Attack time budget spent", extra={
+                                "attack_type": attack_name, "time_budget_seconds": time_budget, "images_skipped": skipped,
+                            })
+                            break
+                    batch_idx = misses[start:start + batch_size]
+                    start += len(batch_idx)
+                    self._rebalance_threads()
+                    batch_start = time.perf_counter()
+                    batch_results = self._attack_batch(
+                        [test_images[i] for i in batch_idx],
+                        images_np[batch_idx],
+                        clean_pred[batch_idx],
+                        attack, classifier, scan_id, user_id, attack_name,
+                        cache_keys=[cache_keys[i] for i in batch_idx],
+                    )
+                    for i, result in zip(batch_idx, batch_results):
+                        attack_results[i] = result
+                    per_image_seconds = (time.perf_counter() - batch_start) / len(batch_idx)
+                    group = (batch_results, self._take_pending_writes(), time.perf_counter() - batch_start)
+                    if pending_group is not None:
+                        self._emit_group(pending_group, on_results)
+                    pending_group = group
+
+            if pending_group is not None:
+                self._emit_group(pending_group, on_results)
+
+            if self._archive is not None and len(self._archive):
+                # Compact mode: lazily rendered PNGs become available once this lands
+                with time_stage("archive_save", attack_name):
+                    self._archive.save(archive_path_for(self._get_user_results_dir(user_id), scan_id, attack_name))
+
+            attack_results = [r for r in attack_results if r is not None]
+            logger.info("Attack completed", extra={
+                "attack_type": attack_name, "results": len(attack_results),
+                "cached": len(test_images) - len(misses), "computed": len(misses) - skipped,
+                "duration": round(time.perf_counter() - attack_start, 3),
+            })
+            return attack_results, self._attack_status(
+                ATTACK_PARTIAL if skipped else ATTACK_COMPLETED, params, time_budget, attack_start,
+                images_total=len(test_images), images_attacked=len(test_images) - skipped,
+                images_cached=len(test_images) - len(misses),
+            )
             
         except Exception as e:
-            print(f" {attack_name.upper()} attack failed: {str(e)}")
+            logger.exception("Attack failed", extra={"attack_type": attack_name})
             # Return an error result object or re-raise
-            return [AttackResult(
+            error_results = [AttackResult(
+                attack_type=attack_name,
                 original_image_path="N/A",
                 adversarial_image_path="N/A",
                 original_prediction=f"{attack_name.upper()} Attack Failed",
@@ -83,88 +340,258 @@ class AttackService:
                 confidence_original=0.0, 
                 confidence_adversarial=0.0
             )]
+            if on_results is not None:
+                on_results(error_results, time.perf_counter() - attack_start)
+            return error_results, self._attack_status(
+                ATTACK_FAILED, params, time_budget, attack_start, error=str(e)
+            )
+        finally:
+            self._archive = None
+
+    # Runs synchronously inside an AttackEngine worker process, before the attacks
+    def compute_clean_predictions(self, model_name: str, user_id: str) -> int:
+        """
+        Scan-level clean-inference stage: one batched forward pass over the test
+        images, cached for the attack workers. Returns the number of images, or
+        0 when the clean cache is disabled and each attack does its own pass.
+        """
+        if not self.clean_cache.enabled:
+            return 0
+        metadata = self.model_service.get_model_metadata(model_name, user_id)
+        test_images, image_hashes, images_np = self.model_service.load_test_tensors(user_id, MAX_SCAN_IMAGES)
+        if not test_images:
+            return 0
+
+        model_hash = self.model_service.get_model_hash(model_name, user_id)
+        key = self.clean_cache.make_key(model_hash, image_hashes)
+        if self.clean_cache.get(key) is None:
+            model, _ = self.model_service.load_model(model_name, user_id)
+            classifier = self._create_classifier(model, metadata['nb_classes'])
+            with time_stage("clean_predict"):
+                clean_pred = classifier.predict(images_np, batch_size=ATTACK_BATCH_SIZE)
+            self.clean_cache.put(key, clean_pred)
+        logger.info("Clean predictions ready", extra={"images": len(test_images)})
+        return len(test_images)
+
+    # Runs synchronously inside an AttackEngine worker process
+    def run_epsilon_sweep(self, model_name: str, user_id: str, attack_spec: dict) -> dict:
+        """Robustness curve (robust accuracy vs. epsilon) for one FGSM/PGD attack spec"""
+        attack_name = attack_spec["attack_type"]
+        logger.info("Epsilon sweep started", extra={"attack_type": attack_name, "epsilons": attack_spec["sweep_epsilons"]})
+        sweep_start = time.perf_counter()
+
+        metadata = self.model_service.get_model_metadata(model_name, user_id)
+        test_images, image_hashes, images_np = self.model_service.load_test_tensors(user_id, MAX_SCAN_IMAGES)
+        if not test_images:
+            raise ValueError("No test images found. Please upload images first.")
+
+        model, _ = self.model_service.load_model(model_name, user_id)
+        classifier = self._create_classifier(model, metadata['nb_classes'])
+        model_hash = self.model_service.get_model_hash(model_name, user_id)
+        labels = np.argmax(self._clean_predictions(model_hash, image_hashes, images_np, classifier), axis=1)
+
+        time_budget = attack_spec["time_budget_seconds"]
+        curve = epsilon_sweep(
+            classifier, images_np, labels, attack_spec["sweep_epsilons"], attack_name,
+            attack_spec["params"], ATTACK_BATCH_SIZE,
+            deadline=sweep_start + time_budget if time_budget else None,
+            before_batch=self._rebalance_threads,
+        )
+        curve["elapsed_seconds"] = round(time.perf_counter() - sweep_start, 3)
+        logger.info("Epsilon sweep finished", extra={
+            "attack_type": attack_name, "status": curve["status"], "images": curve["images"],
+            "duration": curve["elapsed_seconds"],
+        })
+        return curve
+
+    async def run_sweeps_parallel(self, model_name: str, user_id: str, attack_specs: list) -> dict:
+        """Run the epsilon sweeps requested in attack_specs; returns {attack_name: curve}"""
+        engine = get_attack_engine()
+        sweep_specs = [spec for spec in attack_specs if spec.get("sweep_epsilons")]
+        outcomes = await asyncio.gather(
+            *(engine.run_epsilon_sweep(model_name, user_id, spec) for spec in sweep_specs),
+            return_exceptions=True,
+        )
+
+        curves = {}
+        for spec, outcome in zip(sweep_specs, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error("Epsilon sweep failed: %s", outcome, extra={"attack_type": spec["attack_type"]})
+                curves[spec["attack_type"]] = {"attack_type": spec["attack_type"], "status": ATTACK_FAILED, "error": str(outcome)}
+            else:
+                curves[spec["attack_type"]] = outcome
+        return curves
+
+    def _clean_predictions(self, model_hash: str, image_hashes: list, images_np: np.ndarray, classifier) -> np.ndarray:
+        """Clean predictions from the scan-level stage, computed here if it didn't run"""
+        key = self.clean_cache.make_key(model_hash, image_hashes)
+        clean_pred = self.clean_cache.get(key)
+        if clean_pred is None or len(clean_pred) != len(images_np):
+            with time_stage("clean_predict"):
+                clean_pred = classifier.predict(images_np, batch_size=ATTACK_BATCH_SIZE)
+            self.clean_cache.put(key, clean_pred)
+        return clean_pred
+
+    @staticmethod
+    def _attack_status(status: str, params: dict, time_budget, attack_start: float, **fields) -> dict:
+        elapsed = time.perf_counter() - attack_start
+        attack_status = {
+            "status": status,
+            "params": params,
+            "time_budget_seconds": time_budget,
+            "elapsed_seconds": round(elapsed, 3),
+            **fields,
+        }
+        if time_budget:
+            # A batch in flight can't be interrupted, so the budget can be exceeded slightly
+            attack_status["budget_overrun_seconds"] = round(max(0.0, elapsed - time_budget), 3)
+        return attack_status
+
+    def _rebalance_threads(self):
+        if self.thread_usage is not None:
+            self.thread_usage.rebalance()
+
+    def _take_pending_writes(self) -> list:
+        writes, self._pending_writes = self._pending_writes, []
+        return writes
+
+    def _emit_group(self, group: tuple, on_results):
+        """Wait for a group's image writes, then hand its results to on_results"""
+        results, writes, elapsed_seconds = group
+        self.image_writer.wait(writes)
+        if on_results is not None:
+            on_results(results, elapsed_seconds)
 
 
     # 👈 New: Function to orchestrate parallel attacks
-    async def run_all_attacks_parallel(self, model_name: str, scan_id: str, user_id: str):
-        """Runs all configured attacks in parallel."""
-        
-        # Create a list of attack tasks
-        tasks = [
-            self._run_single_attack_task(attack_name, model_name, scan_id, user_id)
-            for attack_name in self.ATTACKS.keys()
-        ]
+    async def run_all_attacks_parallel(self, model_name: str, scan_id: str, user_id: str, progress_callback=None, stream: bool = False, attack_specs: list = None):
+        """
+        Runs the pipeline's attacks in parallel on the attack engine's worker processes.
+
+        attack_specs comes from resolve_pipeline; by default the "deep" preset runs.
+        progress_callback, if given, is awaited as (attack_name, completed, total,
+        attack_status) each time an attack finishes. With stream=True, results are
+        delivered batch by batch through the engine's event handler instead of
+        being returned, and the total number of results is returned.
+        """
+        engine = get_attack_engine()
+        if attack_specs is None:
+            attack_specs = self.resolve_pipeline(PipelineRequest(model_name=model_name))
+        completed = 0
+
+        # Clean inference runs once for the whole scan; the attacks read its cached output
+        try:
+            await engine.run_clean_inference(model_name, user_id)
+        except Exception:
+            # Each attack falls back to its own clean pass
+            logger.exception("Clean inference stage failed")
+
+        async def run_and_report(attack_spec: dict):
+            nonlocal completed
+            attack_name = attack_spec["attack_type"]
+            attack_status = {"status": ATTACK_FAILED}
+            try:
+                outcome = await engine.run_attack(
+                    attack_name, model_name, scan_id, user_id, stream=stream, attack_spec=attack_spec
+                )
+                attack_status = outcome if stream else outcome[1]
+                return outcome
+            except Exception as e:
+                attack_status = {"status": ATTACK_FAILED, "error": str(e)}
+                raise
+            finally:
+                completed += 1
+                if progress_callback is not None:
+                    await progress_callback(attack_name, completed, len(attack_specs), attack_status)
+
+        # Each attack runs in its own worker process, on its own cores
+        tasks = [run_and_report(attack_spec) for attack_spec in attack_specs]
         
-        # Run tasks in parallel
         # Use a list to flatten results from all attacks
         all_results = []
+        streamed_count = 0
         
-        # asyncio.gather runs all tasks concurrently.
-        # It waits for all attacks to complete before proceeding.
+        # Awaiting the executor futures keeps the event loop free for other requests
         results_from_all_attacks = await asyncio.gather(*tasks, return_exceptions=True) 
 
-        for result_list in results_from_all_attacks:
-            if isinstance(result_list, list):
-                all_results.extend(result_list)
+        for outcome in results_from_all_attacks:
+            if isinstance(outcome, BaseException):
+                # A worker crashed or the task raised before producing results
+                logger.error("Attack task raised: %s", outcome)
+            elif stream:
+                streamed_count += outcome["results_count"]
             else:
-                # Handle unexpected exceptions from a task if return_exceptions=True
-                print(f"An attack task returned an exception: {result_list}")
-                # You might log this or add a specific error result to all_results
+                all_results.extend(outcome[0])
                 
-        return all_results
+        return streamed_count if stream else all_results
 
-    # 👈 Modified: Add attack_name to the result
-    async def _attack_single_image(self, image_path: str, attack, classifier, scan_id: str, user_id: str, attack_name: str): 
-        """Attack a single image and return result."""
-        
-        original_tensor = self.model_service.preprocess_image(image_path)
-        original_np = original_tensor.numpy()
-        
-        # Generate adversarial example
-        adversarial_np = attack.generate(x=original_np)
-        
-        # Get predictions
-        original_pred = classifier.predict(original_np)
-        adversarial_pred = classifier.predict(adversarial_np)
-        
-        # Save adversarial image to user's results directory
-        adv_image_path = self._save_adversarial_image(
-            adversarial_np[0], scan_id, user_id, attack_name # Pass attack_name for unique path
-        )
-        
-        # Calculate metrics
-        original_class = np.argmax(original_pred[0])
-        adversarial_class = np.argmax(adversarial_pred[0])
+    def _attack_batch(self, image_paths: list, original_np: np.ndarray, original_pred: np.ndarray, attack, classifier, scan_id: str, user_id: str, attack_name: str, cache_keys: list = None):
+        """Attack a mini-batch of preprocessed images given their clean predictions; one result per image."""
+        original_class = np.argmax(original_pred, axis=1)
+
+        # Clean labels as y spare the attack its own clean forward pass
+        with time_stage("generate", attack_name):
+            adversarial_np = attack.generate(x=original_np, y=original_class)
+        with time_stage("adversarial_predict", attack_name):
+            adversarial_pred = classifier.predict(adversarial_np, batch_size=len(adversarial_np))
+
+        # Calculate metrics, vectorized over the batch
+        adversarial_class = np.argmax(adversarial_pred, axis=1)
         attack_success = original_class != adversarial_class
-        
-        # L2 norm of the perturbation (difference between original and adversarial)
-        perturbation = adversarial_np[0] - original_np[0]
-        perturbation_norm = np.linalg.norm(perturbation)
-        
+        confidence_original = np.max(original_pred, axis=1)
+        confidence_adversarial = np.max(adversarial_pred, axis=1)
+
+        # L2 norm of the perturbation per image
+        perturbation = (adversarial_np - original_np).reshape(len(original_np), -1)
+        perturbation_norm = np.linalg.norm(perturbation, axis=1)
+
+        results = []
+        for i, image_path in enumerate(image_paths):
+            # Save adversarial image to user's results directory
+            adv_image_path = self._save_adversarial_image(
+                adversarial_np[i], scan_id, user_id, attack_name,
+                original_array=original_np[i], original_path=image_path
+            )
+            metrics = dict(
+                original_class=int(original_class[i]),
+                adversarial_class=int(adversarial_class[i]),
+                confidence_original=float(confidence_original[i]),
+                confidence_adversarial=float(confidence_adversarial[i]),
+                attack_success=bool(attack_success[i]),
+                perturbation_norm=float(perturbation_norm[i]),
+            )
+            if cache_keys is not None:
+                self.result_cache.put(cache_keys[i], adversarial_np[i], adv_image_path, **metrics)
+            results.append(self._build_result(attack_name, image_path, adv_image_path, metrics))
+            # Sampled per-image event; skipped entirely unless DEBUG is on
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Image attacked", extra={
+                    "sampled": True, "attack_type": attack_name, "image": os.path.basename(image_path), **metrics,
+                })
+        return results
+
+    def _build_result(self, attack_name: str, image_path: str, adv_image_path: str, metrics: dict) -> AttackResult:
         return AttackResult(
-            attack_type=attack_name, # 👈 Added attack_type to schema/result
+            attack_type=attack_name,
             original_image_path=image_path,
             adversarial_image_path=adv_image_path,
-            original_prediction=f"Class {original_class}",
-            adversarial_prediction=f"Class {adversarial_class}",
-            confidence_original=float(np.max(original_pred[0])),
-            confidence_adversarial=float(np.max(adversarial_pred[0])),
-            attack_success=attack_success,
-            perturbation_norm=float(perturbation_norm)
+            original_prediction=f"Class {metrics['original_class']}",
+            adversarial_prediction=f"Class {metrics['adversarial_class']}",
+            **metrics
         )
-    
-    def _get_test_images(self, user_id: str):
-        """Get list of test images for specific user"""
-        data_dir = os.path.join("uploads", user_id, "data")
-        if not os.path.exists(data_dir):
-            return []
-        
-        images = []
-        for file in os.listdir(data_dir):
-            if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                images.append(os.path.join(data_dir, file))
-        
-        return images
+
+    def _result_from_cache(self, entry: dict, image_path: str, original_array, scan_id: str, user_id: str, attack_name: str) -> AttackResult:
+        """Build a result from a cache entry, reusing its PNG when this user already has it"""
+        adv_image_path = entry["adversarial_image_path"]
+        on_disk = os.path.join(self.results_dir, *adv_image_path.split("/")[2:])
+        if not (adv_image_path.startswith(f"/results/{user_id}/") and os.path.exists(on_disk)):
+            adv_image_path = self._save_adversarial_image(
+                entry["adversarial"], scan_id, user_id, attack_name,
+                original_array=original_array, original_path=image_path
+            )
+        # The entry also holds the cached array and image path, which aren't result fields
+        metrics = {field: entry[field] for field in METRIC_FIELDS}
+        return self._build_result(attack_name, image_path, adv_image_path, metrics)
     
     def _get_user_results_dir(self, user_id: str): # 👈 ADD THIS METHOD
         """Get user-specific results directory"""
@@ -173,30 +600,28 @@ class AttackService:
         os.makedirs(user_results_dir, exist_ok=True)
         return user_results_dir
     
-    def _save_adversarial_image(self, adversarial_array, scan_id, user_id, attack_name): # Added attack_name
-        """Save adversarial image to user-specific directory"""
+    def _save_adversarial_image(self, adversarial_array, scan_id, user_id, attack_name, original_array=None, original_path=None):
+        """
+        Persist an adversarial image for a user and return its /results URL.
+
+        PNG mode queues the encode on the background writer pool; compact mode
+        records a float16 perturbation in the scan's archive instead, and the
+        PNG is rendered when the URL is first requested.
+        """
         user_results_dir = self._get_user_results_dir(user_id)
-        
-        # Denormalization is crucial for viewing the image correctly.
-        # This uses the inverse of the standard ImageNet normalization.
-        denorm_transform = transforms.Compose([
-            transforms.Normalize(mean=[0.0, 0.0, 0.0], std=[1/0.229, 1/0.224, 1/0.225]),
-            transforms.Normalize(mean=[-0.485, -0.456, -0.406], std=[1.0, 1.0, 1.0]),
-        ])
-        
-        tensor = torch.from_numpy(adversarial_array)
-        # ART's output is often normalized. Clamp to [0, 1] after denormalization.
-        denorm_tensor = denorm_transform(tensor) 
-        denorm_tensor = torch.clamp(denorm_tensor, 0, 1)
-        
-        # Convert to PIL and save
-        to_pil = transforms.ToPILImage()
-        image = to_pil(denorm_tensor)
-        
+
         # Include attack name in filename for organization
-        filename = f"{attack_name}_{scan_id}_{uuid.uuid4().hex[:8]}.png"
-        filepath = os.path.join(user_results_dir, filename)
-        image.save(filepath)
-        
+        key = uuid.uuid4().hex[:8]
+        filename = f"{attack_name}_{scan_id}_{key}.png"
+
+        if self._archive is not None and original_array is not None:
+            self._archive.add(key, adversarial_array, original_array, original_path)
+        else:
+            filepath = os.path.join(user_results_dir, filename)
+            # Copy so the caller's batch buffer can be reused while the write is queued
+            self._pending_writes.append(
+                self.image_writer.submit(write_png, np.array(adversarial_array, dtype=np.float32), filepath)
+            )
+
         # Return the path for the API response
-        return f"/results/{user_id}/{filename}"
\ No newline at end of file
+        return f"/results/{user_id}/{filename}"
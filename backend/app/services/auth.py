@@ -1,5 +1,4 @@
-from google.oauth2 import id_token
-from google.auth.transport import requests
+from google.auth import jwt as google_jwt
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
@@ -10,8 +9,10 @@ from app.config import (
     GOOGLE_CLIENT_ID,
     JWT_SECRET_KEY,
     JWT_ALGORITHM,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    GOOGLE_TOKEN_ISSUERS
 )
+from app.services.auth_cache import google_certs, token_payloads
 
 security = HTTPBearer()
 
@@ -19,56 +20,40 @@ class AuthService:
     @staticmethod
     def verify_google_token(token: str) -> dict:
         """Verify Google OAuth token and extract user info"""
-        print("Starting Google token verification...")
-        
         try:
             if not GOOGLE_CLIENT_ID:
-                error_msg = "GOOGLE_CLIENT_ID environment variable is not set"
-                print(f" {error_msg}")
-                raise ValueError(error_msg)
-            
-            print(f"✓ GOOGLE_CLIENT_ID is set: {GOOGLE_CLIENT_ID[:20]}...")
-            print(" Calling Google's token verification API...")
-            
+                raise ValueError("GOOGLE_CLIENT_ID environment variable is not set")
+
+            # Certs are cached per their Cache-Control headers; a new key id forces a refetch
+            certs = google_certs.get(jwt.get_unverified_header(token).get("kid"))
             # Add clock_skew_in_seconds to handle time differences
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                requests.Request(), 
-                GOOGLE_CLIENT_ID,
+            idinfo = google_jwt.decode(
+                token,
+                certs=certs,
+                audience=GOOGLE_CLIENT_ID,
                 clock_skew_in_seconds=10
             )
-            
-            print(f" Token verified successfully!")
-            print(f"   - Email: {idinfo.get('email')}")
-            print(f"   - Name: {idinfo.get('name')}")
-            
-            if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
+
+            if idinfo['iss'] not in GOOGLE_TOKEN_ISSUERS:
                 raise ValueError('Wrong issuer.')
-            
+
             user_data = {
                 "user_id": idinfo['sub'],
                 "email": idinfo['email'],
                 "name": idinfo.get('name', ''),
                 "picture": idinfo.get('picture', '')
             }
-            
-            print(f" User data extracted: {user_data['email']}")
             return user_data
-            
-        except ValueError as e:
-            print(f" ValueError: {str(e)}")
+
+        except (ValueError, jwt.InvalidTokenError) as e:
             raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
         except Exception as e:
-            print(f" Exception: {type(e).__name__}: {str(e)}")
-            import traceback
-            traceback.print_exc()
             raise HTTPException(status_code=401, detail=f"Token verification failed: {str(e)}")
     
     @staticmethod
     def create_access_token(user_data: dict) -> str:
         """Create JWT access token"""
-        print(" Creating JWT access token...")
-        
+
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         to_encode = {
             "user_id": user_data["user_id"],
@@ -76,25 +61,25 @@ class AuthService:
             "name": user_data["name"],
             "exp": expire
         }
-        
-        print(f"   - Expires at: {expire}")
-        print(f"   - User: {user_data['email']}")
-        
+
         encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
-        
-        print(f" JWT created successfully")
         return encoded_jwt
     
     @staticmethod
     def decode_token(token: str) -> dict:
         """Decode and verify JWT token"""
+        # Verified payloads are reused until exp, so most requests skip the HMAC check
+        payload = token_payloads.get(token)
+        if payload is not None:
+            return payload
         try:
             payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-            return payload
         except jwt.ExpiredSignatureError:
             raise HTTPException(status_code=401, detail="Token has expired")
-        except jwt.JWTError:
+        except jwt.InvalidTokenError:
             raise HTTPException(status_code=401, detail="Invalid token")
+        token_payloads.put(token, payload)
+        return payload
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> dict:
     """Dependency to get current authenticated user"""
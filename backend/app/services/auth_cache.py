@@ -0,0 +1,137 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from app.config import (
+    GOOGLE_CERTS_URL,
+    GOOGLE_CERTS_DEFAULT_TTL_SECONDS,
+    GOOGLE_CERTS_TIMEOUT_SECONDS,
+    JWT_PAYLOAD_CACHE_SIZE,
+)
+
+# An unknown key id may mean Google rotated its keys; refetch at most this often for it
+MIN_REFRESH_INTERVAL_SECONDS = 30
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def cache_lifetime(headers, default: float) -> float:
+    """Seconds a response may be reused, from Cache-Control max-age minus Age"""
+    cache_control = headers.get("Cache-Control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0.0
+    match = _MAX_AGE.search(cache_control)
+    if match is None:
+        return default
+    try:
+        age = float(headers.get("Age", 0))
+    except ValueError:
+        age = 0.0
+    return max(0.0, int(match.group(1)) - age)
+
+
+class CertCache:
+    """
+    Signing certs ({key id: PEM}) of the token issuer, fetched over a pooled
+    session and reused until the response's cache headers say they are stale.
+    """
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, default_ttl: float = GOOGLE_CERTS_DEFAULT_TTL_SECONDS,
+                 timeout: float = GOOGLE_CERTS_TIMEOUT_SECONDS, session: requests.Session = None,
+                 min_refresh_interval: float = MIN_REFRESH_INTERVAL_SECONDS):
+        self.url = url
+        self.default_ttl = default_ttl
+        self.timeout = timeout
+        self.min_refresh_interval = min_refresh_interval
+        self.session = session or requests.Session()
+        self._certs = None
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        # Held while fetching, so concurrent logins share one request
+        self._lock = threading.Lock()
+
+    def get(self, key_id: str = None) -> dict:
+        """Current certs; refetched when expired or when key_id is unknown"""
+        with self._lock:
+            now = time.monotonic()
+            stale = self._certs is None or now >= self._expires_at
+            rotated = (
+                key_id is not None
+                and self._certs is not None
+                and key_id not in self._certs
+                and now - self._fetched_at >= self.min_refresh_interval
+            )
+            if stale or rotated:
+                self._fetch(now)
+            return self._certs
+
+    def _fetch(self, now: float):
+        response = self.session.get(self.url, timeout=self.timeout)
+        if response.status_code != 200:
+            raise ValueError(f"Could not fetch certificates at {self.url} (HTTP {response.status_code})")
+        self._certs = response.json()
+        self._fetched_at = now
+        self._expires_at = now + cache_lifetime(response.headers, self.default_ttl)
+
+    def clear(self):
+        with self._lock:
+            self._certs = None
+            self._expires_at = 0.0
+
+
+class TokenPayloadCache:
+    """
+    Thread-safe LRU of verified JWT payloads keyed by the token's SHA-256
+    digest. Entries are only served until the token's exp, after which the
+    caller re-verifies (and rejects) the token.
+    """
+
+    def __init__(self, max_entries: int = JWT_PAYLOAD_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # digest -> (payload, exp)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        """A copy of the cached payload, or None on a miss or once expired"""
+        if self.max_entries <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, exp = entry
+            if exp <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(payload)
+
+    def put(self, token: str, payload: dict):
+        """Cache a payload that was just verified; tokens without exp are not cached"""
+        exp = payload.get("exp")
+        if self.max_entries <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (dict(payload), exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every request in the process
+google_certs = CertCache()
+token_payloads = TokenPayloadCache()
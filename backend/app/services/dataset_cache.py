@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# Shape of one preprocessed image, as produced by ModelService.preprocess_image
+TENSOR_SHAPE = (3, 224, 224)
+
+# One lock per data directory; uploads for a user append from the API process only
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _locks_guard:
+        if path not in _locks:
+            _locks[path] = threading.Lock()
+        return _locks[path]
+
+
+class TensorDatasetCache:
+    """
+    Per-user cache of preprocessed test images.
+
+    Tensors are appended as raw float32 rows to tensors.f32 and listed, in row
+    order, in tensors_index.json. Readers memory-map the file, so scans never
+    decode or resize an image that was already preprocessed at upload time.
+    The index is written after the data, so a reader never sees a partial row.
+    """
+
+    DATA_FILENAME = "tensors.f32"
+    INDEX_FILENAME = "tensors_index.json"
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.data_path = os.path.join(data_dir, self.DATA_FILENAME)
+        self.index_path = os.path.join(data_dir, self.INDEX_FILENAME)
+
+    def _read_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {"shape": list(TENSOR_SHAPE), "dtype": "float32", "entries": []}
+        with open(self.index_path, 'r') as f:
+            return json.load(f)
+
+    def _write_index(self, index: dict):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def append(self, filename: str, tensor: np.ndarray, **entry_fields):
+        """Append one preprocessed image (shape TENSOR_SHAPE) to the cache"""
+        row = np.ascontiguousarray(tensor, dtype=np.float32).reshape(TENSOR_SHAPE)
+
+        with _lock_for(self.data_dir):
+            index = self._read_index()
+            entries = index["entries"]
+
+            # Truncate any bytes left over from an append that never reached the index
+            row_bytes = row.nbytes
+            with open(self.data_path, "ab") as f:
+                f.truncate(len(entries) * row_bytes)
+                f.write(row.tobytes())
+
+            entries.append({"filename": filename, "row": len(entries), **entry_fields})
+            self._write_index(index)
+
+    def entries(self) -> list:
+        """Index entries in row order"""
+        return self._read_index()["entries"]
+
+    def load(self):
+        """Return (entries, read-only memmap of shape (N, 3, 224, 224)); memmap is None when empty"""
+        index = self._read_index()
+        entries = index["entries"]
+        if not entries:
+            return [], None
+
+        tensors = np.memmap(
+            self.data_path,
+            dtype=np.float32,
+            mode="r",
+            shape=(len(entries),) + tuple(index["shape"]),
+        )
+        return entries, tensors
@@ -0,0 +1,170 @@
+import contextvars
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+from PIL import Image
+
+from app.config import IMAGE_WRITER_THREADS, IMAGE_WRITER_MAX_PENDING, THUMBNAIL_SIZE, THUMBNAIL_FORMAT
+from app.utils.metrics import time_stage
+
+# Standard ImageNet normalization used by ModelService.preprocess_image, shaped for (3, H, W)
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+
+# Per-scan perturbation archives live here, inside each user's results directory
+COMPACT_SUBDIR = "compact"
+# Gallery thumbnails live here, named after their full-size image
+THUMBNAIL_SUBDIR = "thumbs"
+THUMBNAIL_EXTENSIONS = {"webp": ".webp", "png": ".png"}
+
+
+def denormalize_to_uint8(normalized_array: np.ndarray) -> np.ndarray:
+    """Undo ImageNet normalization on a (3, H, W) array and return an (H, W, 3) uint8 image"""
+    image = np.asarray(normalized_array, dtype=np.float32) * IMAGENET_STD + IMAGENET_MEAN
+    image = np.clip(image, 0.0, 1.0)
+    return np.rint(image * 255.0).astype(np.uint8).transpose(1, 2, 0)
+
+
+def _save_atomic(image: Image.Image, filepath: str, image_format: str, **options):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format=image_format, **options)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def thumbnail_path_for(filepath: str) -> str:
+    """Thumbnail file for a full-size image in a user's results directory"""
+    directory, filename = os.path.split(filepath)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, THUMBNAIL_SUBDIR, stem + THUMBNAIL_EXTENSIONS.get(THUMBNAIL_FORMAT, ".png"))
+
+
+def thumbnail_url_for(image_url: str) -> str:
+    """'/results/{user}/{name}.png' -> '/results/{user}/thumbs/{name}.webp'"""
+    return thumbnail_path_for(image_url).replace(os.sep, "/")
+
+
+@time_stage("thumbnail_save")
+def write_thumbnail(image: Image.Image, filepath: str):
+    """Downscale a full-size image into its thumbnail file, atomically"""
+    thumbnail_path = thumbnail_path_for(filepath)
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    thumbnail = image.copy()
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+    if THUMBNAIL_FORMAT == "webp":
+        _save_atomic(thumbnail, thumbnail_path, "WEBP", quality=80, method=4)
+    else:
+        _save_atomic(thumbnail, thumbnail_path, "PNG", optimize=True)
+
+
+@time_stage("image_save")
+def write_png(normalized_array: np.ndarray, filepath: str, thumbnail: bool = True):
+    """Encode a normalized adversarial array as PNG, atomically, plus its gallery thumbnail"""
+    image = Image.fromarray(denormalize_to_uint8(normalized_array))
+    _save_atomic(image, filepath, "PNG")
+    if thumbnail:
+        write_thumbnail(image, filepath)
+
+
+class AdversarialImageWriter:
+    """
+    Bounded background pool for image persistence.
+
+    submit() blocks once IMAGE_WRITER_MAX_PENDING writes are in flight, so a
+    fast attack loop can't queue unbounded arrays in memory.
+    """
+
+    def __init__(self, max_workers: int = IMAGE_WRITER_THREADS, max_pending: int = IMAGE_WRITER_MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="image-writer")
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+
+    def submit(self, fn, *args):
+        self._slots.acquire()
+        try:
+            # Run in the caller's context so stage timings reach its collector
+            future = self._executor.submit(contextvars.copy_context().run, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    @staticmethod
+    def wait(futures):
+        """Wait for writes and re-raise the first failure"""
+        for future in wait(futures).done:
+            future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class PerturbationArchive:
+    """
+    Collects float16 perturbations (adversarial - original) for one scan and attack.
+
+    Saved as one compressed .npz per scan/attack; each entry is keyed by the
+    adversarial image's file stem and records the original image path so the
+    PNG can be rendered on first request.
+    """
+
+    def __init__(self):
+        self._deltas = {}
+        self._originals = {}
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def add(self, key: str, adversarial: np.ndarray, original: np.ndarray, original_path: str):
+        self._deltas[key] = (np.asarray(adversarial, dtype=np.float32) - original).astype(np.float16)
+        self._originals[key] = original_path
+
+    def save(self, archive_path: str):
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+        arrays = {f"delta_{key}": delta for key, delta in self._deltas.items()}
+        arrays.update({f"original_{key}": np.array(path) for key, path in self._originals.items()})
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(archive_path), suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, archive_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def archive_path_for(user_results_dir: str, scan_id: str, attack_name: str) -> str:
+    return os.path.join(user_results_dir, COMPACT_SUBDIR, f"{scan_id}_{attack_name}.npz")
+
+
+def parse_adversarial_filename(filename: str):
+    """Split '{attack}_{scan_id}_{key}.png' into (attack, scan_id, key); attack names may contain '_'"""
+    stem, ext = os.path.splitext(filename)
+    parts = stem.rsplit("_", 2)
+    if ext.lower() != ".png" or len(parts) != 3:
+        return None
+    return parts[0], parts[1], parts[2]
+
+
+def load_perturbation(user_results_dir: str, filename: str):
+    """Return (delta float32, original image path) for a lazily stored image, or None"""
+    parsed = parse_adversarial_filename(filename)
+    if parsed is None:
+        return None
+    attack_name, scan_id, key = parsed
+    archive_path = archive_path_for(user_results_dir, scan_id, attack_name)
+    if not os.path.exists(archive_path):
+        return None
+    with np.load(archive_path, allow_pickle=False) as data:
+        if f"delta_{key}" not in data.files:
+            return None
+        return data[f"delta_{key}"].astype(np.float32), str(data[f"original_{key}"])
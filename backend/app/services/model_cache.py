@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+
+from app.config import MODEL_CACHE_MAX_ENTRIES, MODEL_CACHE_MAX_BYTES
+
+
+def estimate_model_bytes(model) -> int:
+    """Approximate in-memory size of a model (parameters + buffers)"""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelCache:
+    """
+    Thread-safe LRU cache of loaded models.
+
+    Keys are (user_id, model_name, fingerprint) where the fingerprint identifies
+    the checkpoint on disk, so an overwritten file never serves a stale model.
+    Eviction happens when either the entry cap or the byte cap is exceeded.
+
+    Each process has its own cache, and invalidate() only reaches the calling
+    process. Attack workers therefore drop a model's older versions themselves
+    when they load a new one, and each gets a share of the byte cap.
+    """
+
+    def __init__(self, max_entries: int = MODEL_CACHE_MAX_ENTRIES, max_bytes: int = MODEL_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (model, metadata, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (model, metadata) for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key, model, metadata: dict):
+        """Insert a model and evict least recently used entries over the caps"""
+        if self.max_entries <= 0:
+            return
+        size = estimate_model_bytes(model)
+        if size > self.max_bytes:
+            # Never cache a model that alone exceeds the budget
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[2]
+            self._entries[key] = (model, metadata, size)
+            self._total_bytes += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def invalidate(self, user_id: str, model_name: str):
+        """Drop every cached version of a user's model"""
+        with self._lock:
+            stale = [k for k in self._entries if k[0] == user_id and k[1] == model_name]
+            for key in stale:
+                _, _, size = self._entries.pop(key)
+                self._total_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Process-wide cache shared by every ModelService instance
+model_cache = ModelCache()
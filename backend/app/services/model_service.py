@@ -1,11 +1,50 @@
 import os
-import torch
-import torchvision.transforms as transforms
+import numpy as np
+from functools import lru_cache
 from PIL import Image
 from fastapi import UploadFile
 import uuid
 import json # New import
+import asyncio
+import hashlib
+import logging
+import tempfile
 from datetime import datetime
+from app.config import UPLOAD_CHUNK_SIZE, MAX_MODEL_UPLOAD_BYTES, MAX_IMAGE_UPLOAD_BYTES, COMPILE_MODELS_ON_UPLOAD
+from app.services.model_cache import model_cache
+from app.services.dataset_cache import TensorDatasetCache
+from app.utils.metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+# torch and torchvision are imported on first use, so API processes that never
+# touch a model (auth, health, listings) start without loading them
+
+@lru_cache(maxsize=1)
+def image_transform():
+    """Preprocessing pipeline, built once per process instead of on every call"""
+    import torchvision.transforms as transforms
+    return transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                             std=[0.229, 0.224, 0.225])
+    ])
+
+# Input every model must accept, matching image_transform()'s output
+MODEL_INPUT_SHAPE = (3, 224, 224)
+
+# Artifact formats recorded in model metadata
+ARTIFACT_TORCHSCRIPT = "torchscript"
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds its configured maximum size"""
+
+class ModelValidationError(Exception):
+    """Raised when an uploaded checkpoint is not a usable classifier"""
+
+class InvalidImageError(Exception):
+    """Raised when an uploaded test image can't be decoded"""
 
 class ModelService:
     def __init__(self):
@@ -23,6 +62,41 @@ class ModelService:
         
         return model_dir, data_dir
     
+    async def _stream_upload(self, file: UploadFile, dest_path: str, max_bytes: int):
+        """
+        Copy an upload to dest_path in fixed-size chunks, hashing as it goes.
+
+        FastAPI has already spooled the file by the time this runs, so
+        max_bytes is checked while copying, not while the request arrives;
+        BodySizeLimitMiddleware bounds the request itself. The data lands in a
+        temp file in the destination directory and is atomically renamed into
+        place, so readers never see a partial file.
+        Returns (sha256 hex digest, size in bytes).
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path), suffix=".part")
+        try:
+            with time_stage("upload_stream"), os.fdopen(fd, "wb") as buffer:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLargeError(
+                            f"{file.filename} exceeds the maximum upload size of {max_bytes} bytes"
+                        )
+                    digest.update(chunk)
+                    buffer.write(chunk)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return digest.hexdigest(), size
+
     async def save_model(self, file: UploadFile, model_name: str, nb_classes: int, user_id: str) -> str: # Added nb_classes
         """Save uploaded model file and metadata for specific user"""
         model_dir, _ = self._get_user_directories(user_id)
@@ -33,17 +107,35 @@ class ModelService:
         model_filename = f"{model_name_clean}.{file_extension}"
         model_path = os.path.join(model_dir, model_filename)
         
-        # 1. Save model file
-        with open(model_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # 1. Stream to a staging file so a rejected upload leaves the previous model intact
+        staging_path = f"{model_path}.upload"
+        sha256, size_bytes = await self._stream_upload(file, staging_path, MAX_MODEL_UPLOAD_BYTES)
+
+        # 2. Ingest: load once, validate input/output shapes, compile the scan-time artifact
+        artifact_filename = f"{model_name_clean}.{ARTIFACT_TORCHSCRIPT}.pt"
+        try:
+            artifact = await asyncio.to_thread(
+                self._ingest_model, staging_path, nb_classes, os.path.join(model_dir, artifact_filename)
+            )
+        except BaseException:
+            os.remove(staging_path)
+            raise
+        os.replace(staging_path, model_path)
+
+        # Any cached copy of the previous checkpoint in this process is now stale;
+        # attack workers drop theirs on the next load (see ModelService.load_model)
+        model_cache.invalidate(user_id, model_name_clean)
             
-        # 2. Save metadata (REQUIRED for loading the model correctly)
+        # 3. Save metadata (REQUIRED for loading the model correctly)
         metadata_path = os.path.join(model_dir, f"{model_name_clean}.json")
         metadata = {
             "model_name": model_name_clean,
             "nb_classes": nb_classes,
             "filename": model_filename,
+            "sha256": sha256,
+            "size_bytes": size_bytes,
+            "input_shape": list(MODEL_INPUT_SHAPE),
+            **artifact,
             "upload_time": str(datetime.now())
         }
         with open(metadata_path, 'w') as f:
@@ -51,6 +143,73 @@ class ModelService:
 
         return model_path
 
+    @time_stage("model_ingest")
+    def _ingest_model(self, checkpoint_path: str, nb_classes: int, artifact_path: str) -> dict:
+        """
+        Load an uploaded checkpoint once, check it maps (N, 3, 224, 224) to
+        (N, nb_classes), and save a traced TorchScript artifact for scans.
+
+        Returns the metadata fields describing the artifact. Raises
+        ModelValidationError if the checkpoint is not a usable classifier; a
+        model that can't be traced is kept, and scans load the checkpoint.
+        """
+        import torch
+
+        model = self._load_checkpoint(checkpoint_path)
+        if not isinstance(model, torch.nn.Module):
+            raise ModelValidationError(
+                f"Expected a full PyTorch model, got {type(model).__name__} "
+                "(state_dict checkpoints can't be loaded without their architecture)"
+            )
+        model.eval()
+
+        # Two samples, so a model that drops or hard-codes the batch dimension is caught
+        example = torch.zeros((2, *MODEL_INPUT_SHAPE))
+        try:
+            with torch.no_grad():
+                output = model(example)
+        except Exception as e:
+            raise ModelValidationError(f"Model does not accept input of shape (N, {', '.join(map(str, MODEL_INPUT_SHAPE))}): {str(e)}")
+        if not isinstance(output, torch.Tensor) or tuple(output.shape) != (2, nb_classes):
+            shape = tuple(output.shape) if isinstance(output, torch.Tensor) else type(output).__name__
+            raise ModelValidationError(f"Model output {shape} does not match (N, {nb_classes}) for nb_classes={nb_classes}")
+
+        if not COMPILE_MODELS_ON_UPLOAD:
+            return {"artifact_format": None, "artifact_filename": None}
+
+        try:
+            with torch.no_grad():
+                traced = torch.jit.trace(model, example)
+                if not torch.allclose(traced(example), output, rtol=1e-4, atol=1e-5):
+                    raise ValueError("traced output differs from the eager model")
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(artifact_path), suffix=".pt.tmp")
+            os.close(fd)
+            try:
+                torch.jit.save(traced, tmp_path)
+                os.replace(tmp_path, artifact_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except Exception as e:
+            # Data-dependent control flow and similar can't be traced; fall back to the checkpoint
+            logger.warning("Could not compile model to TorchScript, scans will load the checkpoint: %s", e)
+            if os.path.exists(artifact_path):
+                os.remove(artifact_path)
+            return {"artifact_format": None, "artifact_filename": None, "artifact_error": str(e)}
+
+        return {"artifact_format": ARTIFACT_TORCHSCRIPT, "artifact_filename": os.path.basename(artifact_path)}
+
+    @staticmethod
+    def _load_checkpoint(path: str):
+        """Load an uploaded checkpoint, which may already be TorchScript"""
+        import torch
+        try:
+            return torch.jit.load(path, map_location='cpu')
+        except (RuntimeError, ValueError):
+            # Not a TorchScript archive: a pickled model
+            return torch.load(path, map_location='cpu', weights_only=False)
+
     async def save_test_image(self, file: UploadFile, user_id: str) -> str:
         """Save uploaded test image for specific user"""
         _, data_dir = self._get_user_directories(user_id)
@@ -59,10 +218,18 @@ class ModelService:
         image_filename = f"test_{uuid.uuid4().hex[:8]}.{file_extension}"
         image_path = os.path.join(data_dir, image_filename)
         
-        with open(image_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
+        sha256, _ = await self._stream_upload(file, image_path, MAX_IMAGE_UPLOAD_BYTES)
+
+        # Preprocess once at upload time so scans can read the tensor directly; decoding
+        # (and the first torch import) runs off the event loop
+        try:
+            tensor = await asyncio.to_thread(self.preprocess_image, image_path)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Keep the data directory and the tensor index in step
+            os.remove(image_path)
+            raise InvalidImageError(f"Could not decode {file.filename}: {str(e)}")
+        await asyncio.to_thread(TensorDatasetCache(data_dir).append, image_filename, tensor.numpy()[0], sha256=sha256)
+
         return image_path
     
     def get_user_images(self, user_id: str) -> list:
@@ -80,6 +247,65 @@ class ModelService:
         
         return images
 
+    @time_stage("load_test_tensors")
+    def load_test_tensors(self, user_id: str, limit: int):
+        """
+        Return (image_paths, image_hashes, array of shape (N, 3, 224, 224)) for up to `limit` test images.
+
+        Images preprocessed at upload time come straight from the memory-mapped
+        tensor cache (a zero-copy view when no other images are needed); images
+        uploaded before the cache existed are preprocessed and hashed here.
+        """
+        _, data_dir = self._get_user_directories(user_id)
+        entries, tensors = TensorDatasetCache(data_dir).load()
+        entries = entries[:limit]
+
+        image_paths = [os.path.join(data_dir, entry["filename"]) for entry in entries]
+        image_hashes = [
+            entry.get("sha256") or self.file_sha256(path)
+            for entry, path in zip(entries, image_paths)
+        ]
+        cached = tensors[:len(entries)] if tensors is not None else None
+
+        remaining = limit - len(image_paths)
+        if remaining <= 0:
+            return image_paths, image_hashes, cached
+
+        indexed = {entry["filename"] for entry in entries}
+        uncached_paths = [
+            image["path"] for image in self.get_user_images(user_id)
+            if image["filename"] not in indexed
+        ][:remaining]
+        if not uncached_paths:
+            return image_paths, image_hashes, cached
+
+        uncached = np.concatenate(
+            [self.preprocess_image(path).numpy() for path in uncached_paths], axis=0
+        )
+        arrays = [cached, uncached] if cached is not None else [uncached]
+        return (
+            image_paths + uncached_paths,
+            image_hashes + [self.file_sha256(path) for path in uncached_paths],
+            np.concatenate(arrays, axis=0).astype(np.float32),
+        )
+
+    @staticmethod
+    def file_sha256(path: str) -> str:
+        """SHA-256 of a file on disk, read in chunks"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_model_hash(self, model_name: str, user_id: str) -> str:
+        """Content hash of a model checkpoint (recorded at upload, computed for older models)"""
+        metadata = self.get_model_metadata(model_name, user_id)
+        if metadata.get("sha256"):
+            return metadata["sha256"]
+        model_dir, _ = self._get_user_directories(user_id)
+        return self.file_sha256(os.path.join(model_dir, metadata["filename"]))
+
     def get_model_metadata(self, model_name: str, user_id: str) -> dict: # New helper function
         """Retrieve model metadata"""
         model_dir, _ = self._get_user_directories(user_id)
@@ -93,28 +319,45 @@ class ModelService:
             return json.load(f)
 
     def load_model(self, model_name: str, user_id: str): # Modified to take name and user_id
-        """Load PyTorch model"""
+        """
+        Load PyTorch model, served from the process-wide cache when possible.
+
+        Prefers the TorchScript artifact compiled at upload, which loads without
+        unpickling arbitrary objects; older uploads fall back to the checkpoint.
+        """
 
         try:
             model_dir, _ = self._get_user_directories(user_id)
             metadata = self.get_model_metadata(model_name, user_id)
-            model_path = os.path.join(model_dir, metadata['filename'])
+            artifact_filename = metadata.get('artifact_filename')
+            compiled = artifact_filename is not None and os.path.exists(os.path.join(model_dir, artifact_filename))
+            model_path = os.path.join(model_dir, artifact_filename if compiled else metadata['filename'])
 
-            model = torch.load(model_path, map_location='cpu')
+            # The file's mtime and size identify the checkpoint version on disk
+            stat = os.stat(model_path)
+            cache_key = (user_id, metadata['model_name'], stat.st_mtime_ns, stat.st_size)
+            cached = model_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            # A miss with other versions cached means the model was re-uploaded; the
+            # upload's invalidate() only ran in the API process, so drop them here
+            model_cache.invalidate(user_id, metadata['model_name'])
+
+            with time_stage("model_load"):
+                import torch
+                if compiled:
+                    model = torch.jit.load(model_path, map_location='cpu')
+                else:
+                    model = torch.load(model_path, map_location='cpu', weights_only=False)
             model.eval()
+            model_cache.put(cache_key, model, metadata)
             return model, metadata
         except Exception as e:
             raise Exception(f"Error loading model: {str(e)}")
             
     # ... (rest of ModelService is the same)
+    @time_stage("preprocess")
     def preprocess_image(self, image_path: str):
         """Preprocess image for model input"""
-        transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                               std=[0.229, 0.224, 0.225])
-        ])
-        
         image = Image.open(image_path).convert('RGB')
-        return transform(image).unsqueeze(0)
\ No newline at end of file
+        return image_transform()(image).unsqueeze(0)
\ No newline at end of file
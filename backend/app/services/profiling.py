@@ -0,0 +1,66 @@
+import cProfile
+import io
+import os
+import pstats
+from contextlib import contextmanager
+
+# Profile artifacts live here, inside each user's results directory
+PROFILE_SUBDIR = "profiles"
+
+# Profilers a scan can ask for
+CPROFILE = "cprofile"
+TORCH_PROFILER = "torch"
+
+# Functions listed in the plain-text cProfile summary
+SUMMARY_LINES = 40
+
+
+def profilers_for(profile: bool, profile_torch: bool) -> list:
+    return ([CPROFILE] if profile else []) + ([TORCH_PROFILER] if profile_torch else [])
+
+
+@contextmanager
+def profile_job(user_results_dir: str, user_id: str, name: str, profilers: list):
+    """
+    Profile the enclosed block with the requested profilers.
+
+    Yields a dict that is filled on exit with /results URLs of the artifacts:
+    "pstats" (cProfile dump), "pstats_summary" (top functions by cumulative
+    time) and "chrome_trace" (torch profiler, viewable in chrome://tracing or
+    Perfetto). Only the calling thread is profiled by cProfile.
+    """
+    profile_dir = os.path.join(user_results_dir, PROFILE_SUBDIR)
+    os.makedirs(profile_dir, exist_ok=True)
+    artifacts = {}
+
+    def url(filename: str) -> str:
+        return f"/results/{user_id}/{PROFILE_SUBDIR}/{filename}"
+
+    torch_profiler = None
+    if TORCH_PROFILER in profilers:
+        from torch.profiler import profile, ProfilerActivity
+        torch_profiler = profile(activities=[ProfilerActivity.CPU], record_shapes=True)
+        torch_profiler.__enter__()
+
+    cprofiler = None
+    if CPROFILE in profilers:
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+
+    try:
+        yield artifacts
+    finally:
+        if cprofiler is not None:
+            cprofiler.disable()
+            cprofiler.dump_stats(os.path.join(profile_dir, f"{name}.pstats"))
+            summary = io.StringIO()
+            pstats.Stats(cprofiler, stream=summary).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+            with open(os.path.join(profile_dir, f"{name}.pstats.txt"), "w") as f:
+                f.write(summary.getvalue())
+            artifacts["pstats"] = url(f"{name}.pstats")
+            artifacts["pstats_summary"] = url(f"{name}.pstats.txt")
+
+        if torch_profiler is not None:
+            torch_profiler.__exit__(None, None, None)
+            torch_profiler.export_chrome_trace(os.path.join(profile_dir, f"{name}.trace.json"))
+            artifacts["chrome_trace"] = url(f"{name}.trace.json")
@@ -0,0 +1,362 @@
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+# Percentiles reported for the perturbation-norm distributions
+NORM_PERCENTILES = (50, 90, 95, 99)
+
+# Number of most vulnerable classes listed in the report
+TOP_CLASSES = 10
+
+# Number of (original -> adversarial) class pairs listed in scan summaries
+TOP_CONFUSION_PAIRS = 20
+
+_CLASS_PATTERN = re.compile(r"Class (-?\d+)")
+
+# Attack display names, in report order
+ATTACK_LABELS = {
+    "fgsm": "FGSM",
+    "pgd": "PGD",
+    "c_and_w": "C&W",
+    "deepfool": "DeepFool",
+}
+
+# Recommended primary defense, keyed by the most successful attack
+PRIMARY_DEFENSES = {
+    "fgsm": "Adversarial training with FGSM/PGD examples to smooth the locally linear loss surface.",
+    "pgd": "PGD adversarial training (Madry et al.), the strongest known empirical defense against iterative L-inf attacks.",
+    "c_and_w": "PGD adversarial training combined with certified or randomized-smoothing defenses for small L2 perturbations.",
+    "deepfool": "Adversarial training with minimal-norm (DeepFool-style) examples to enlarge decision margins.",
+}
+
+SECONDARY_DEFENSES = [
+    "Add input preprocessing defenses (e.g. JPEG compression, feature squeezing or spatial smoothing) as a first filter.",
+    "Monitor prediction confidence and flag inputs whose confidence drops sharply under small perturbations.",
+    "Re-run this scan after every retraining to track robustness regressions.",
+]
+
+
+def _parse_class(value, prediction: str) -> int:
+    if value is not None:
+        return int(value)
+    match = _CLASS_PATTERN.search(prediction or "")
+    return int(match.group(1)) if match else -1
+
+
+# Security score of a scan in which no attack produced a single test result
+INCONCLUSIVE = "INCONCLUSIVE"
+
+
+def security_score(asr: float, tests: int) -> str:
+    """Map an overall attack success rate to a severity level; INCONCLUSIVE without tests"""
+    if not tests:
+        return INCONCLUSIVE
+    if asr >= 0.75:
+        return "CRITICAL"
+    if asr >= 0.5:
+        return "HIGH"
+    if asr >= 0.25:
+        return "MEDIUM"
+    return "LOW"
+
+
+class ResultColumns:
+    """Columnar (one NumPy array per field) view of a scan's attack results"""
+
+    def __init__(self, attack_names, attack_id, original_class, adversarial_class,
+                 confidence_original, confidence_adversarial, perturbation_norm,
+                 attack_success, failed_attacks=None):
+        self.attack_names = list(attack_names)
+        self.attack_id = np.asarray(attack_id, dtype=np.int16)
+        self.original_class = np.asarray(original_class, dtype=np.int32)
+        self.adversarial_class = np.asarray(adversarial_class, dtype=np.int32)
+        self.confidence_original = np.asarray(confidence_original, dtype=np.float32)
+        self.confidence_adversarial = np.asarray(confidence_adversarial, dtype=np.float32)
+        self.perturbation_norm = np.asarray(perturbation_norm, dtype=np.float32)
+        self.attack_success = np.asarray(attack_success, dtype=bool)
+        self.failed_attacks = list(failed_attacks or [])
+
+    # Numeric columns, in the order they are stored on disk
+    ARRAYS = (
+        "attack_id", "original_class", "adversarial_class", "confidence_original",
+        "confidence_adversarial", "perturbation_norm", "attack_success",
+    )
+
+    def __len__(self):
+        return len(self.attack_id)
+
+    def select(self, mask: np.ndarray) -> "ResultColumns":
+        """Rows where mask is true; attack names and failures are kept"""
+        return ResultColumns(
+            self.attack_names, *(getattr(self, name)[mask] for name in self.ARRAYS),
+            failed_attacks=self.failed_attacks,
+        )
+
+    def save(self, path: str):
+        """Write the columns as one uncompressed .npz, atomically"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        arrays["attack_names"] = np.array(self.attack_names, dtype=str)
+        arrays["failed_attacks"] = np.array(json.dumps(self.failed_attacks))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "ResultColumns":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["attack_names"].tolist(), *(data[name] for name in cls.ARRAYS),
+                failed_attacks=json.loads(str(data["failed_attacks"])),
+            )
+
+    @classmethod
+    def from_results(cls, results: list) -> "ResultColumns":
+        """Build columns from AttackResult dicts; error placeholders are recorded as failed attacks"""
+        attack_names = []
+        attack_index = {}
+        failed_attacks = []
+        rows = []
+
+        for result in results:
+            attack_type = result["attack_type"]
+            if result.get("original_image_path") == "N/A":
+                failed_attacks.append({
+                    "attack_type": attack_type,
+                    "error": result.get("adversarial_prediction", ""),
+                })
+                continue
+            if attack_type not in attack_index:
+                attack_index[attack_type] = len(attack_names)
+                attack_names.append(attack_type)
+            rows.append((
+                attack_index[attack_type],
+                _parse_class(result.get("original_class"), result.get("original_prediction")),
+                _parse_class(result.get("adversarial_class"), result.get("adversarial_prediction")),
+                result["confidence_original"],
+                result["confidence_adversarial"],
+                result["perturbation_norm"],
+                result["attack_success"],
+            ))
+
+        columns = list(zip(*rows)) if rows else [[]] * 7
+        return cls(attack_names, *columns, failed_attacks=failed_attacks)
+
+
+def _percentiles(values: np.ndarray) -> dict:
+    if values.size == 0:
+        return {f"p{p}": None for p in NORM_PERCENTILES}
+    return {
+        f"p{p}": float(v)
+        for p, v in zip(NORM_PERCENTILES, np.percentile(values, NORM_PERCENTILES))
+    }
+
+
+def _safe_ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator, dtype=np.float64), where=denominator > 0)
+
+
+def compute_report_stats(columns: ResultColumns) -> dict:
+    """Aggregate ASR, norms and confidence changes overall, per attack and per class"""
+    total = len(columns)
+    success = columns.attack_success
+    success_weights = success.astype(np.float64)
+    norms = columns.perturbation_norm
+    confidence_change = columns.confidence_adversarial - columns.confidence_original
+    overall_asr = float(success.mean()) if total else 0.0
+
+    # Per-attack aggregates via bincount over the attack id column
+    k = len(columns.attack_names)
+    counts = np.bincount(columns.attack_id, minlength=k)
+    successes = np.bincount(columns.attack_id, weights=success_weights, minlength=k)
+    norm_sums = np.bincount(columns.attack_id, weights=norms, minlength=k)
+    success_norm_sums = np.bincount(columns.attack_id, weights=norms * success_weights, minlength=k)
+    confidence_sums = np.bincount(columns.attack_id, weights=confidence_change, minlength=k)
+
+    asr = _safe_ratio(successes, counts)
+    mean_norm = _safe_ratio(norm_sums, counts)
+    mean_success_norm = _safe_ratio(success_norm_sums, successes)
+    mean_confidence_change = _safe_ratio(confidence_sums, counts)
+
+    attacks = []
+    for i, name in enumerate(columns.attack_names):
+        in_attack = columns.attack_id == i
+        attacks.append({
+            "attack_type": name,
+            "tests": int(counts[i]),
+            "successes": int(successes[i]),
+            "asr": float(asr[i]),
+            "mean_perturbation_norm": float(mean_norm[i]),
+            "mean_successful_norm": float(mean_success_norm[i]) if successes[i] else None,
+            "mean_confidence_change": float(mean_confidence_change[i]),
+            "norm_percentiles": _percentiles(norms[in_attack]),
+        })
+
+    # Most successful attack: highest ASR, then lowest mean norm; none when nothing succeeded
+    most_successful = None
+    if any(attack["successes"] for attack in attacks):
+        most_successful = min(attacks, key=lambda a: (-a["asr"], a["mean_perturbation_norm"]))["attack_type"]
+
+    # Per-class aggregates over the original (clean) prediction
+    classes = []
+    if total:
+        class_ids, inverse = np.unique(columns.original_class, return_inverse=True)
+        class_counts = np.bincount(inverse)
+        class_successes = np.bincount(inverse, weights=success_weights)
+        class_asr = _safe_ratio(class_successes, class_counts)
+        order = np.lexsort((-class_counts, -class_asr))[:TOP_CLASSES]
+        classes = [
+            {
+                "class_id": int(class_ids[i]),
+                "tests": int(class_counts[i]),
+                "successes": int(class_successes[i]),
+                "asr": float(class_asr[i]),
+            }
+            for i in order
+        ]
+
+    return {
+        "overall": {
+            "tests": total,
+            "successes": int(success.sum()),
+            "asr": overall_asr,
+            "security_score": security_score(overall_asr, total),
+            "most_successful_attack": most_successful,
+            "norm_percentiles": _percentiles(norms),
+            "successful_norm_percentiles": _percentiles(norms[success]),
+        },
+        "attacks": attacks,
+        "classes": classes,
+        "failed_attacks": columns.failed_attacks,
+    }
+
+
+def confusion_pairs(columns: ResultColumns, top: int = TOP_CONFUSION_PAIRS) -> list:
+    """Most frequent (original class -> adversarial class) flips among successful attacks"""
+    success = columns.attack_success
+    total = int(success.sum())
+    if not total:
+        return []
+    pairs = np.stack([columns.original_class[success], columns.adversarial_class[success]], axis=1)
+    unique, counts = np.unique(pairs, axis=0, return_counts=True)
+    order = np.lexsort((unique[:, 1], unique[:, 0], -counts))[:top]
+    return [
+        {
+            "original_class": int(unique[i, 0]),
+            "adversarial_class": int(unique[i, 1]),
+            "count": int(counts[i]),
+            "share": float(counts[i] / total),
+        }
+        for i in order
+    ]
+
+
+def compute_scan_summary(columns: ResultColumns) -> dict:
+    """Report statistics plus the top confusion pairs, for the summary endpoint"""
+    summary = compute_report_stats(columns)
+    summary["confusion_pairs"] = confusion_pairs(columns)
+    return summary
+
+
+def _fmt(value, digits: int = 4) -> str:
+    return "n/a" if value is None else f"{value:.{digits}f}"
+
+
+def _label(attack_type: str) -> str:
+    return ATTACK_LABELS.get(attack_type, attack_type.upper())
+
+
+def render_markdown(stats: dict, model_name: str = None, narrative: str = None) -> str:
+    """Render the security report sections from computed stats"""
+    overall = stats["overall"]
+    lines = ["# Adversarial Robustness Report"]
+    if model_name:
+        lines.append(f"**Model:** `{model_name}`")
+    lines.append("")
+
+    lines += [
+        "## 1. Executive Summary & Security Score",
+        f"- **Security score:** {overall['security_score']}",
+    ]
+    if not overall["tests"]:
+        # Nothing was tested, so there is nothing to conclude about robustness
+        lines.append("- **No attack completed on any test image;** the scan says nothing about this model's robustness.")
+        for failed in stats["failed_attacks"]:
+            lines.append(f"- **{_label(failed['attack_type'])} did not run:** {failed['error']}")
+        if not stats["failed_attacks"]:
+            lines.append("- The scan had no test images to attack. Upload images and run it again.")
+        lines.append("")
+        return "\n".join(lines)
+
+    lines.append(
+        f"- **Overall Attack Success Rate (ASR):** {overall['asr']:.1%} "
+        f"({overall['successes']}/{overall['tests']} adversarial tests)"
+    )
+    if overall["most_successful_attack"]:
+        lines.append(f"- **Most successful attack:** {_label(overall['most_successful_attack'])}")
+    else:
+        lines.append("- **Most successful attack:** none (no attack changed a prediction)")
+    for failed in stats["failed_attacks"]:
+        lines.append(f"- **{_label(failed['attack_type'])} did not run:** {failed['error']}")
+    for partial in stats.get("partial_attacks", []):
+        lines.append(
+            f"- **{_label(partial['attack_type'])} was cut short by its time budget:** "
+            f"{partial['images_attacked']}/{partial['images_total']} images attacked"
+        )
+    lines.append("")
+
+    lines += [
+        "## 2. Attack Analysis & Breakpoints",
+        "| Attack | Tests | ASR | Avg. Perturbation Norm (L2) | Avg. Norm of Successful | "
+        "Avg. Confidence Change | Norm p50 / p95 |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for attack in stats["attacks"]:
+        pct = attack["norm_percentiles"]
+        lines.append(
+            f"| {_label(attack['attack_type'])} | {attack['tests']} | {attack['asr']:.1%} | "
+            f"{_fmt(attack['mean_perturbation_norm'])} | {_fmt(attack['mean_successful_norm'])} | "
+            f"{_fmt(attack['mean_confidence_change'])} | {_fmt(pct['p50'])} / {_fmt(pct['p95'])} |"
+        )
+    lines.append("")
+
+    pct = overall["successful_norm_percentiles"]
+    lines += [
+        "### Perturbation norm distribution of successful attacks",
+        " | ".join(f"p{p}: {_fmt(pct[f'p{p}'])}" for p in NORM_PERCENTILES),
+        "",
+    ]
+
+    if stats["classes"]:
+        lines += [
+            "### Most vulnerable classes",
+            "| Class | Tests | Successes | ASR |",
+            "|---|---|---|---|",
+        ]
+        for cls in stats["classes"]:
+            lines.append(f"| {cls['class_id']} | {cls['tests']} | {cls['successes']} | {cls['asr']:.1%} |")
+        lines.append("")
+
+    primary = PRIMARY_DEFENSES.get(
+        overall["most_successful_attack"], PRIMARY_DEFENSES["pgd"]
+    )
+    lines += [
+        "## 3. Mitigation Recommendations",
+        f"- **Primary defense:** {primary}",
+    ]
+    lines += [f"- {step}" for step in SECONDARY_DEFENSES]
+    lines.append("")
+
+    if narrative:
+        lines += ["## 4. Analyst Narrative", narrative.strip(), ""]
+
+    return "\n".join(lines)
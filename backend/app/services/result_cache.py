@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from app.config import (
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_MAX_BYTES,
+    CLEAN_PREDICTION_CACHE_DIR,
+    CLEAN_PREDICTION_CACHE_ENABLED,
+    CLEAN_PREDICTION_CACHE_MAX_BYTES,
+)
+
+# Bump when preprocessing or metric computation changes so old entries stop matching
+CACHE_VERSION = 1
+
+# Attack params that only affect throughput, not the adversarial example
+_NON_SEMANTIC_PARAMS = {"batch_size", "verbose"}
+
+# Scalar metrics stored alongside the adversarial array
+METRIC_FIELDS = (
+    "original_class",
+    "adversarial_class",
+    "confidence_original",
+    "confidence_adversarial",
+    "attack_success",
+    "perturbation_norm",
+)
+
+
+# Pruning brings a cache directory down to this share of its byte cap, so it
+# doesn't run again on the very next write
+PRUNE_TARGET_RATIO = 0.9
+
+
+class DiskBudget:
+    """
+    Keeps the files under a cache directory within max_bytes, removing the least
+    recently used first. Reads refresh a file's mtime, so mtime order is LRU
+    order across every process sharing the directory.
+
+    The directory is scanned on the first write and then after every
+    max_bytes / 20 written by this process, not on each write. Several
+    processes may prune at once; files already removed by another are skipped.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._check_every = max(1, max_bytes // 20)
+        self._written = self._check_every
+
+    @staticmethod
+    def touch(path: str):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def added(self, size: int):
+        """Record a write of `size` bytes and prune when enough has been written"""
+        if self.max_bytes <= 0:
+            return
+        self._written += size
+        if self._written >= self._check_every:
+            self._written = 0
+            self.prune()
+
+    def prune(self) -> int:
+        """Remove least recently used files until the directory fits; returns bytes freed"""
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".tmp"):
+                    # Another process's write in progress
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        freed = 0
+        target = total - self.max_bytes * PRUNE_TARGET_RATIO
+        for _, size, path in sorted(files):
+            if freed >= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            freed += size
+        return freed
+
+
+class AttackResultCache:
+    """
+    Content-addressed store of per-image attack results.
+
+    Entries are keyed by (model hash, image hash, attack name, attack params),
+    so they are valid for any scan that attacks the same bytes with the same
+    configuration. Each entry is a small .npz with the adversarial example
+    (float16) and its metrics, written atomically. The directory is kept under
+    max_bytes (0 = unbounded) by evicting the least recently used entries.
+    """
+
+    def __init__(self, cache_dir: str = RESULT_CACHE_DIR, enabled: bool = RESULT_CACHE_ENABLED,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.budget = DiskBudget(cache_dir, max_bytes)
+
+    @staticmethod
+    def make_key(model_hash: str, image_hash: str, attack_name: str, params: dict, nb_classes: int) -> str:
+        semantic_params = {k: v for k, v in params.items() if k not in _NON_SEMANTIC_PARAMS}
+        payload = json.dumps({
+            "version": CACHE_VERSION,
+            "model": model_hash,
+            "image": image_hash,
+            "attack": attack_name,
+            "params": semantic_params,
+            "nb_classes": nb_classes,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npz")
+
+    def get(self, key: str):
+        """Return a cached entry dict (metrics, 'adversarial', 'adversarial_image_path') or None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {field: data[field].item() for field in METRIC_FIELDS}
+                entry["adversarial"] = data["adversarial"].astype(np.float32)
+                entry["adversarial_image_path"] = str(data["adversarial_image_path"])
+            self.budget.touch(path)
+            return entry
+        except (OSError, KeyError, ValueError):
+            # Corrupt or partial entry; treat as a miss and let it be rewritten
+            return None
+
+    def get_many(self, keys: list) -> list:
+        return [self.get(key) for key in keys]
+
+    def put(self, key: str, adversarial: np.ndarray, adversarial_image_path: str, **metrics):
+        """Store one result; concurrent writers of the same key simply replace each other"""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    adversarial=np.asarray(adversarial, dtype=np.float16),
+                    adversarial_image_path=np.array(adversarial_image_path),
+                    **{field: np.array(metrics[field]) for field in METRIC_FIELDS},
+                )
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.budget.added(size)
+
+
+class CleanPredictionCache:
+    """
+    Clean-input model outputs for one model and one ordered set of test images.
+
+    Written once by the scan's clean-inference stage and read by every attack
+    worker, so the unattacked forward pass runs once per image rather than once
+    per attack. When disabled, the stage is skipped and each attack runs its
+    own clean pass. Kept under max_bytes like AttackResultCache.
+    """
+
+    def __init__(self, cache_dir: str = CLEAN_PREDICTION_CACHE_DIR, enabled: bool = CLEAN_PREDICTION_CACHE_ENABLED,
+                 max_bytes: int = CLEAN_PREDICTION_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.budget = DiskBudget(cache_dir, max_bytes)
+
+    @staticmethod
+    def make_key(model_hash: str, image_hashes: list) -> str:
+        payload = json.dumps({
+            "version": CACHE_VERSION,
+            "model": model_hash,
+            "images": list(image_hashes),
+        })
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key: str):
+        """Return the (N, nb_classes) float32 predictions or None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            predictions = np.load(path, allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        self.budget.touch(path)
+        return predictions
+
+    def put(self, key: str, predictions: np.ndarray):
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(predictions, dtype=np.float32))
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.budget.added(size)
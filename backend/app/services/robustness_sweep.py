@@ -0,0 +1,111 @@
+import time
+
+import numpy as np
+from art.utils import check_and_transform_label_format
+
+# Attacks with an L-inf epsilon that the sweep knows how to run
+SWEEPABLE_ATTACKS = ("fgsm", "pgd")
+
+
+def validate_sweep_params(attack_name: str, params: dict):
+    """Raise ValueError if an attack's params can't be swept"""
+    if attack_name not in SWEEPABLE_ATTACKS:
+        raise ValueError(f"Epsilon sweeps support {', '.join(SWEEPABLE_ATTACKS)}, not '{attack_name}'")
+    if params.get("norm", np.inf) not in (np.inf, "inf"):
+        raise ValueError(f"Epsilon sweeps only support the L-inf norm ('{attack_name}' uses {params['norm']})")
+    if params.get("targeted"):
+        raise ValueError("Epsilon sweeps only support untargeted attacks")
+
+
+def _clip(classifier, x: np.ndarray) -> np.ndarray:
+    if classifier.clip_values is None:
+        return x
+    low, high = classifier.clip_values
+    return np.clip(x, low, high)
+
+
+def _sign_gradient(classifier, x: np.ndarray, y_onehot: np.ndarray) -> np.ndarray:
+    return np.sign(classifier.loss_gradient(x, y_onehot))
+
+
+def _pgd_from(classifier, x: np.ndarray, x_start: np.ndarray, y_onehot: np.ndarray, eps: float, params: dict) -> np.ndarray:
+    """L-inf PGD around x, starting from x_start (which must lie inside the eps ball)"""
+    eps_step = min(params.get("eps_step", 0.1), eps)
+    x_adv = x_start
+    for _ in range(params.get("max_iter", 100)):
+        x_adv = x_adv + eps_step * _sign_gradient(classifier, x_adv, y_onehot)
+        x_adv = _clip(classifier, x + np.clip(x_adv - x, -eps, eps))
+    return x_adv
+
+
+def sweep_batch(classifier, images: np.ndarray, labels: np.ndarray, epsilons: list, attack_name: str, params: dict) -> np.ndarray:
+    """
+    Attack one batch at every epsilon (ascending) and return an (len(epsilons), N)
+    bool array: whether each image still gets its clean label.
+
+    An image broken at one epsilon counts as broken at every larger one, so only
+    intact images are attacked again. FGSM reuses one gradient sign for all
+    epsilons; PGD warm-starts from the previous epsilon's adversarial example,
+    which already lies inside the larger ball.
+    """
+    y_onehot = check_and_transform_label_format(labels, nb_classes=classifier.nb_classes)
+    intact = np.ones(len(images), dtype=bool)
+    robust = np.zeros((len(epsilons), len(images)), dtype=bool)
+
+    if attack_name == "fgsm":
+        direction = _sign_gradient(classifier, images, y_onehot)
+    else:
+        x_adv = images.copy()
+
+    for row, eps in enumerate(epsilons):
+        idx = np.flatnonzero(intact)
+        if len(idx):
+            if attack_name == "fgsm":
+                candidates = _clip(classifier, images[idx] + eps * direction[idx])
+            else:
+                candidates = _pgd_from(classifier, images[idx], x_adv[idx], y_onehot[idx], eps, params)
+                x_adv[idx] = candidates
+            predicted = np.argmax(classifier.predict(candidates, batch_size=len(candidates)), axis=1)
+            intact[idx] = predicted == labels[idx]
+        robust[row] = intact
+    return robust
+
+
+def epsilon_sweep(classifier, images: np.ndarray, labels: np.ndarray, epsilons: list, attack_name: str,
+                  params: dict, batch_size: int, deadline: float = None, before_batch=None) -> dict:
+    """
+    Robust accuracy (share of images keeping their clean label) versus epsilon.
+
+    Runs batch by batch so memory stays bounded; if `deadline` (perf_counter
+    time) passes, the remaining batches are skipped and the curve is marked
+    partial over the images evaluated so far. before_batch, if given, is
+    called ahead of every batch.
+    """
+    epsilons = sorted({float(eps) for eps in epsilons})
+    intact_counts = np.zeros(len(epsilons), dtype=np.int64)
+    attacked_counts = np.zeros(len(epsilons), dtype=np.int64)
+    evaluated = 0
+    status = "completed"
+
+    for start in range(0, len(images), batch_size):
+        if deadline is not None and time.perf_counter() >= deadline:
+            status = "partial"
+            break
+        if before_batch is not None:
+            before_batch()
+        batch = np.asarray(images[start:start + batch_size], dtype=np.float32)
+        robust = sweep_batch(classifier, batch, labels[start:start + batch_size], epsilons, attack_name, params)
+        intact_counts += robust.sum(axis=1)
+        # Images still intact before an epsilon are the ones attacked at it
+        attacked_counts += np.vstack([np.ones((1, len(batch)), dtype=bool), robust[:-1]]).sum(axis=1)
+        evaluated += len(batch)
+
+    return {
+        "attack_type": attack_name,
+        "status": status,
+        "images": evaluated,
+        "epsilons": epsilons,
+        "robust_accuracy": (intact_counts / max(1, evaluated)).round(4).tolist(),
+        "broken": (evaluated - intact_counts).tolist(),
+        "attacked": attacked_counts.tolist(),
+    }
@@ -0,0 +1,56 @@
+import asyncio
+import os
+from collections import defaultdict
+
+# Event types that end a scan's stream
+TERMINAL_EVENTS = ("completed", "failed")
+
+
+def result_event(seq: int, result: dict, elapsed_seconds: float) -> dict:
+    """Per-image event payload for one stored AttackResult"""
+    return {
+        "event": "result",
+        "seq": seq,
+        "attack_type": result.get("attack_type"),
+        "image": os.path.basename(result.get("original_image_path") or ""),
+        "attack_success": result.get("attack_success"),
+        "perturbation_norm": result.get("perturbation_norm"),
+        "elapsed_seconds": elapsed_seconds,
+        "result": result,
+    }
+
+
+class ScanEventBus:
+    """
+    In-process fan-out of live scan events to streaming clients.
+
+    publish() must be called on the event loop thread; worker threads use
+    loop.call_soon_threadsafe to get there.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, scan_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers[scan_id].add(queue)
+        return queue
+
+    def unsubscribe(self, scan_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(scan_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[scan_id]
+
+    def publish(self, scan_id: str, event: dict):
+        for queue in list(self._subscribers.get(scan_id, ())):
+            queue.put_nowait(event)
+
+    def publish_many(self, scan_id: str, events: list):
+        for event in events:
+            self.publish(scan_id, event)
+
+
+scan_event_bus = ScanEventBus()
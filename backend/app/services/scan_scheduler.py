@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+
+from app.config import MAX_CONCURRENT_SCANS, MAX_SCANS_PER_USER
+from app.services.scan_store import (
+    save_scan_to_disk,
+    update_scan_on_disk,
+    find_scans_by_status,
+    find_scans_with_pending_report,
+    claim_scan,
+    get_scan_from_disk,
+    append_scan_results,
+    save_scan_columns,
+    load_scan_columns,
+)
+from app.services.scan_events import scan_event_bus, result_event
+from app.utils.metrics import SCANS, collect_timings, summarize_timings
+from app.utils.log import log_context
+
+# Scan job states, as stored in the scan record's "status" field
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Report states, stored in "report_status"
+REPORT_PENDING = "pending"
+REPORT_READY = "ready"
+REPORT_FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+def _process_start_time(pid: int):
+    """Start time of a process in clock ticks since boot, from /proc; None where unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesized command name; starttime is field 22
+            return int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+# This API process, recorded as the owner of the scans it runs and the reports it
+# generates, so other workers sharing the scan store leave them alone
+INSTANCE_OWNER = {
+    "instance_id": uuid.uuid4().hex,
+    "host": socket.gethostname(),
+    "pid": os.getpid(),
+    "process_started": _process_start_time(os.getpid()),
+}
+
+
+def owner_alive(owner) -> bool:
+    """Whether the API process recorded as a scan's owner is still running"""
+    if not owner:
+        # Recorded before scans had owners
+        return False
+    if owner.get("instance_id") == INSTANCE_OWNER["instance_id"]:
+        return True
+    if owner.get("host") != INSTANCE_OWNER["host"]:
+        # Processes on other hosts can't be checked; leave their scans to them
+        return True
+    pid = owner.get("pid")
+    if not isinstance(pid, int) or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        pass
+    # A reused pid belongs to a process that started at a different time
+    started = owner.get("process_started")
+    return started is None or _process_start_time(pid) == started
+
+
+class ScanScheduler:
+    """
+    Runs scan jobs in the background with a global and a per-user concurrency cap.
+
+    Job state lives in the scan store, so GET /scan/{scan_id} reports it like
+    any other scan record. `reporter` replaces the ReporterService built for
+    each report, e.g. one with a stand-in LLM client.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_SCANS, max_per_user: int = MAX_SCANS_PER_USER,
+                 reporter=None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_user = max(1, max_per_user)
+        self.reporter = reporter
+        self._global_slots = None
+        self._user_slots = {}
+        self._tasks = set()
+        self._loop = None
+
+    def _slots_for(self, user_id: str) -> asyncio.Semaphore:
+        if user_id not in self._user_slots:
+            self._user_slots[user_id] = asyncio.Semaphore(self.max_per_user)
+        return self._user_slots[user_id]
+
+    async def submit(self, scan_id: str, user_id: str, model_name: str, attack_specs: list, mode: str) -> dict:
+        """Record a queued scan of the given attack specs and schedule it; returns the initial scan record"""
+        if self._global_slots is None:
+            # Created lazily so the semaphore binds to the running event loop
+            self._global_slots = asyncio.Semaphore(self.max_concurrent)
+            self._loop = asyncio.get_running_loop()
+
+        scan_data = {
+            "scan_id": scan_id,
+            "status": QUEUED,
+            "created_at": datetime.now().isoformat(),
+            "message": "Scan queued",
+            "model_name": model_name,
+            "attack_type": ", ".join(spec["attack_type"].upper() for spec in attack_specs),
+            "epsilon": next((spec["params"]["eps"] for spec in attack_specs if "eps" in spec["params"]), 0.0),
+            "mode": mode,
+            "pipeline": attack_specs,
+            "attack_status": {},
+            "profiling": any(spec.get("profile") for spec in attack_specs),
+            "progress": {"stage": QUEUED, "completed_attacks": 0, "total_attacks": 0, "percent": 0},
+            "owner": INSTANCE_OWNER,
+            # No "results" key: results are streamed into the store's scan_results table
+        }
+        await asyncio.to_thread(save_scan_to_disk, user_id, scan_id, scan_data)
+
+        self._spawn(self._run(scan_id, user_id, model_name, attack_specs))
+        return scan_data
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, scan_id: str, user_id: str, model_name: str, attack_specs: list):
+        # Take the per-user slot first so one user's backlog can't hold global slots
+        async with self._slots_for(user_id):
+            async with self._global_slots:
+                try:
+                    with log_context(scan_id=scan_id, user_id=user_id):
+                        await self._execute_scan(scan_id, user_id, model_name, attack_specs)
+                except Exception as e:
+                    logger.exception("Scan failed", extra={"scan_id": scan_id, "user_id": user_id})
+                    await asyncio.to_thread(
+                        update_scan_on_disk, user_id, scan_id,
+                        status=FAILED,
+                        message=f"Error running scan: {str(e)}",
+                        finished_at=datetime.now().isoformat(),
+                    )
+                    scan_event_bus.publish(scan_id, {"event": FAILED, "message": str(e)})
+                    SCANS.inc(status=FAILED)
+
+    def _on_worker_event(self, event: dict):
+        """Persist a batch of streamed results and fan it out; runs on the engine's pump thread"""
+        if event["type"] != "results":
+            return
+        scan_id = event["scan_id"]
+        results = event["results"]
+        seqs = append_scan_results(event["user_id"], scan_id, results)
+
+        # Spread the batch time over its images for the per-image events
+        per_image_seconds = event["elapsed_seconds"] / max(1, len(results))
+        events = [result_event(seq, result, per_image_seconds) for seq, result in zip(seqs, results)]
+        self._loop.call_soon_threadsafe(scan_event_bus.publish_many, scan_id, events)
+
+    async def _execute_scan(self, scan_id: str, user_id: str, model_name: str, attack_specs: list):
+        """Run the scan's attacks and persist the completed scan, then queue its report"""
+        from app.services.attack_service import AttackService
+        from app.services.attack_engine import get_attack_engine
+
+        logger.info("Scan started", extra={"model_name": model_name, "attacks": [spec["attack_type"] for spec in attack_specs]})
+        engine = get_attack_engine()
+        engine.event_handler = self._on_worker_event
+        attack_service = AttackService()
+        total_attacks = len(attack_specs)
+        attack_statuses = {}
+
+        # Store writes wait on SQLite's write lock, so they run off the event loop
+        await asyncio.to_thread(
+            update_scan_on_disk, user_id, scan_id,
+            status=RUNNING,
+            message="Running attacks",
+            started_at=datetime.now().isoformat(),
+            thread_allocation=engine.allocation(),
+            progress={"stage": "attacks", "completed_attacks": 0, "total_attacks": total_attacks, "percent": 0},
+        )
+
+        async def on_attack_complete(attack_name: str, completed: int, total: int, attack_status: dict):
+            attack_statuses[attack_name] = attack_status
+            scan_event_bus.publish(scan_id, {
+                "event": "attack_completed",
+                "attack_type": attack_name,
+                "attack_status": attack_status,
+            })
+            await asyncio.to_thread(
+                update_scan_on_disk, user_id, scan_id,
+                attack_status=attack_statuses,
+                progress={
+                    "stage": "attacks",
+                    "completed_attacks": completed,
+                    "total_attacks": total,
+                    "last_attack": attack_name,
+                    "percent": int(100 * completed / total),
+                },
+            )
+
+        # Stage timings from the API process and every worker job of this scan
+        with collect_timings() as timing_samples:
+            # Results stream into the scan store as each batch completes
+            results_count = await attack_service.run_all_attacks_parallel(
+                model_name=model_name,
+                scan_id=scan_id,
+                user_id=user_id,
+                progress_callback=on_attack_complete,
+                stream=True,
+                attack_specs=attack_specs,
+            )
+            partial_attacks = [name for name, status in attack_statuses.items() if status.get("status") == "partial"]
+
+            if any(spec.get("sweep_epsilons") for spec in attack_specs):
+                await asyncio.to_thread(
+                    update_scan_on_disk, user_id, scan_id,
+                    message="Running epsilon sweep",
+                    progress={"stage": "sweep", "completed_attacks": total_attacks, "total_attacks": total_attacks, "percent": 100},
+                )
+                robustness_curve = await attack_service.run_sweeps_parallel(model_name, user_id, attack_specs)
+                await asyncio.to_thread(update_scan_on_disk, user_id, scan_id, robustness_curve=robustness_curve)
+                scan_event_bus.publish(scan_id, {"event": "robustness_curve", "robustness_curve": robustness_curve})
+
+        # Results are final here: store them as columns for the summary endpoint and
+        # the report. Those fall back to the row store if this fails.
+        try:
+            await asyncio.to_thread(save_scan_columns, scan_id)
+        except Exception:
+            logger.exception("Storing result columns failed")
+
+        # The report is produced in a separate background stage
+        await asyncio.to_thread(
+            update_scan_on_disk, user_id, scan_id,
+            status=COMPLETED,
+            message=(
+                f"Scan completed; time budget cut short: {', '.join(partial_attacks)}"
+                if partial_attacks else "Vulnerability scan completed successfully across all attacks"
+            ),
+            partial=bool(partial_attacks),
+            timings=summarize_timings(timing_samples),
+            # Links to per-attack profile artifacts, when profiling was requested
+            profiles={name: status["profile"] for name, status in attack_statuses.items() if status.get("profile")},
+            report_status=REPORT_PENDING,
+            finished_at=datetime.now().isoformat(),
+            progress={"stage": COMPLETED, "completed_attacks": total_attacks, "total_attacks": total_attacks, "percent": 100},
+        )
+        scan_event_bus.publish(scan_id, {"event": COMPLETED, "results_count": results_count})
+        SCANS.inc(status=COMPLETED)
+        logger.info("Scan completed", extra={"results_count": results_count})
+
+        self._spawn(self._generate_report(scan_id, user_id))
+
+    def resume_pending_reports(self):
+        """Re-queue report generation for completed scans whose owner stopped before the report finished"""
+        for user_id, scan_id, owner in find_scans_with_pending_report():
+            if not owner_alive(owner) and claim_scan(user_id, scan_id, INSTANCE_OWNER, owner):
+                self._spawn(self._generate_report(scan_id, user_id))
+
+    async def _generate_report(self, scan_id: str, user_id: str):
+        """Generate the human-readable report without holding a scan slot"""
+        from app.services.reporter_service import ReporterService
+
+        with collect_timings() as timing_samples:
+            try:
+                columns = await asyncio.to_thread(load_scan_columns, scan_id)
+                # With stored columns the JSON result rows are never parsed
+                scan_data = await asyncio.to_thread(get_scan_from_disk, user_id, scan_id, columns is None)
+                reporter_service = self.reporter if self.reporter is not None else ReporterService()
+                report_markdown = await reporter_service.generate_security_report(scan_data, columns)
+            except Exception as e:
+                logger.exception("Report generation failed", extra={"scan_id": scan_id, "user_id": user_id})
+                await asyncio.to_thread(
+                    update_scan_on_disk, user_id, scan_id, report_status=REPORT_FAILED, report_error=str(e)
+                )
+                return
+
+        await asyncio.to_thread(
+            update_scan_on_disk, user_id, scan_id,
+            report_status=REPORT_READY,
+            full_report_markdown=report_markdown,
+            timings={**scan_data.get("timings", {}), **summarize_timings(timing_samples)},
+        )
+
+
+def recover_interrupted_scans():
+    """
+    Mark queued/running scans whose owning process is gone as failed. Scans
+    owned by other live API workers sharing the store are left running.
+    """
+    for user_id, scan_id, owner in find_scans_by_status((QUEUED, RUNNING)):
+        if owner_alive(owner) or not claim_scan(user_id, scan_id, INSTANCE_OWNER, owner):
+            continue
+        update_scan_on_disk(
+            user_id, scan_id,
+            status=FAILED,
+            message="Scan interrupted by a server restart",
+        )
+
+
+_scheduler = None
+
+
+def get_scan_scheduler() -> ScanScheduler:
+    """Return the process-wide scan scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ScanScheduler()
+    return _scheduler
@@ -0,0 +1,349 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from app.utils.metrics import time_stage
+from app.services.report_stats import ResultColumns
+
+# Directory to store scan results persistently
+SCANS_DIR = "scans"
+os.makedirs(SCANS_DIR, exist_ok=True)
+DB_PATH = os.path.join(SCANS_DIR, "scans.db")
+# Columnar copy of each completed scan's results, one .npz per scan
+COLUMNS_DIR = os.path.join(SCANS_DIR, "columns")
+
+# Columns of the summary table that GET /scans may sort on
+SORTABLE_COLUMNS = ("created_at", "model_name", "status", "results_count")
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    scan_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    status TEXT,
+    created_at TEXT,
+    model_name TEXT,
+    attack_type TEXT,
+    results_count INTEGER NOT NULL DEFAULT 0,
+    progress TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scans_user_created ON scans (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_scans_status ON scans (status);
+CREATE TABLE IF NOT EXISTS scan_results (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    scan_id TEXT NOT NULL,
+    attack_type TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scan_results_scan ON scan_results (scan_id, seq);
+CREATE TABLE IF NOT EXISTS report_cache (
+    digest TEXT PRIMARY KEY,
+    report TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    """Return this thread's connection, creating the schema on first use"""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers proceed while a scan is being written
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.executescript(_SCHEMA)
+                _migrate_legacy_files(conn)
+                _initialized = True
+    return conn
+
+
+def _summary_row(conn: sqlite3.Connection, user_id: str, scan_id: str, scan_data: dict) -> tuple:
+    progress = scan_data.get("progress")
+    if "results" in scan_data:
+        results_count = len(scan_data.get("results") or [])
+    else:
+        # Streamed scans keep their results as rows in scan_results
+        results_count = conn.execute(
+            "SELECT COUNT(*) FROM scan_results WHERE scan_id = ?", (scan_id,)
+        ).fetchone()[0]
+    return (
+        scan_id,
+        user_id,
+        scan_data.get("status", "completed"),
+        scan_data.get("created_at"),
+        scan_data.get("model_name"),
+        scan_data.get("attack_type"),
+        results_count,
+        json.dumps(progress) if progress is not None else None,
+        json.dumps(scan_data),
+    )
+
+
+def _upsert(conn: sqlite3.Connection, user_id: str, scan_id: str, scan_data: dict):
+    conn.execute(
+        "INSERT OR REPLACE INTO scans "
+        "(scan_id, user_id, status, created_at, model_name, attack_type, results_count, progress, data) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        _summary_row(conn, user_id, scan_id, scan_data),
+    )
+
+
+def _migrate_legacy_files(conn: sqlite3.Connection):
+    """Import per-user scans.json files written by earlier versions"""
+    for user_id in os.listdir(SCANS_DIR):
+        legacy_file = os.path.join(SCANS_DIR, user_id, "scans.json")
+        if not os.path.isfile(legacy_file):
+            continue
+        with open(legacy_file, 'r') as f:
+            scans = json.load(f)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for scan_id, scan_data in scans.items():
+                _upsert(conn, user_id, scan_id, scan_data)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        os.replace(legacy_file, f"{legacy_file}.migrated")
+
+
+@time_stage("scan_store_write")
+def save_scan_to_disk(user_id: str, scan_id: str, scan_data: dict):
+    """Save scan result to disk"""
+    _upsert(_connect(), user_id, scan_id, scan_data)
+
+
+@time_stage("scan_store_write")
+def update_scan_on_disk(user_id: str, scan_id: str, **fields) -> dict:
+    """Merge fields into an existing scan record and return the updated record"""
+    conn = _connect()
+    # IMMEDIATE takes the write lock up front so concurrent updates can't interleave
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT data FROM scans WHERE scan_id = ? AND user_id = ?", (scan_id, user_id)
+        ).fetchone()
+        scan_data = json.loads(row["data"]) if row else {"scan_id": scan_id}
+        scan_data.update(fields)
+        _upsert(conn, user_id, scan_id, scan_data)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return scan_data
+
+
+def get_scan_from_disk(user_id: str, scan_id: str, include_results: bool = True):
+    """Get a specific scan from disk, including any results streamed in so far"""
+    conn = _connect()
+    row = conn.execute(
+        "SELECT data FROM scans WHERE scan_id = ? AND user_id = ?", (scan_id, user_id)
+    ).fetchone()
+    if not row:
+        return None
+    scan_data = json.loads(row["data"])
+    if include_results and "results" not in scan_data:
+        scan_data["results"] = [result for _, result in get_scan_results(scan_id)]
+    return scan_data
+
+
+def get_scan_status(user_id: str, scan_id: str):
+    """Return (status, results_count) from the summary columns, or None"""
+    row = _connect().execute(
+        "SELECT status, results_count FROM scans WHERE scan_id = ? AND user_id = ?", (scan_id, user_id)
+    ).fetchone()
+    return (row["status"], row["results_count"]) if row else None
+
+
+@time_stage("scan_store_write")
+def append_scan_results(user_id: str, scan_id: str, results: list) -> list:
+    """Append streamed results for a scan; returns their sequence numbers"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        seqs = []
+        for result in results:
+            cursor = conn.execute(
+                "INSERT INTO scan_results (scan_id, attack_type, data) VALUES (?, ?, ?)",
+                (scan_id, result.get("attack_type"), json.dumps(result)),
+            )
+            seqs.append(cursor.lastrowid)
+        conn.execute(
+            "UPDATE scans SET results_count = results_count + ? WHERE scan_id = ? AND user_id = ?",
+            (len(results), scan_id, user_id),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return seqs
+
+
+def get_scan_results(scan_id: str, after_seq: int = 0) -> list:
+    """Return (seq, result) pairs streamed for a scan, in arrival order"""
+    rows = _connect().execute(
+        "SELECT seq, data FROM scan_results WHERE scan_id = ? AND seq > ? ORDER BY seq",
+        (scan_id, after_seq),
+    ).fetchall()
+    return [(row["seq"], json.loads(row["data"])) for row in rows]
+
+
+def get_scan_results_page(scan_id: str, limit: int, offset: int = 0, attack_type: str = None) -> tuple:
+    """Return (total, [(seq, result), ...]) for one page of a scan's results, in arrival order"""
+    conn = _connect()
+    where = "scan_id = ?"
+    params = [scan_id]
+    if attack_type:
+        where += " AND attack_type = ?"
+        params.append(attack_type)
+    total = conn.execute(f"SELECT COUNT(*) FROM scan_results WHERE {where}", params).fetchone()[0]
+    rows = conn.execute(
+        f"SELECT seq, data FROM scan_results WHERE {where} ORDER BY seq LIMIT ? OFFSET ?",
+        params + [limit, offset],
+    ).fetchall()
+    return total, [(row["seq"], json.loads(row["data"])) for row in rows]
+
+
+def _columns_path(scan_id: str) -> str:
+    return os.path.join(COLUMNS_DIR, f"{os.path.basename(scan_id)}.npz")
+
+
+@time_stage("scan_store_write")
+def save_scan_columns(scan_id: str) -> ResultColumns:
+    """Convert a scan's streamed results to columns once and store them; call when results are final"""
+    columns = ResultColumns.from_results([result for _, result in get_scan_results(scan_id)])
+    columns.save(_columns_path(scan_id))
+    return columns
+
+
+def load_scan_columns(scan_id: str):
+    """Columns stored for a completed scan, or None"""
+    path = _columns_path(scan_id)
+    if not os.path.exists(path):
+        return None
+    return ResultColumns.load(path)
+
+
+def get_scan_columns(scan_id: str, final: bool = False) -> ResultColumns:
+    """
+    Columns for a scan: stored ones when available, otherwise built from its
+    results, and stored when `final` (the scan has completed).
+    """
+    columns = load_scan_columns(scan_id)
+    if columns is not None:
+        return columns
+    if final:
+        return save_scan_columns(scan_id)
+    return ResultColumns.from_results([result for _, result in get_scan_results(scan_id)])
+
+
+def list_scan_summaries(user_id: str, limit: int = 50, offset: int = 0,
+                        sort_by: str = "created_at", descending: bool = True):
+    """Return (summaries, total count) for one page of a user's scans, read from the summary columns only"""
+    if sort_by not in SORTABLE_COLUMNS:
+        raise ValueError(f"Cannot sort scans by '{sort_by}'")
+    direction = "DESC" if descending else "ASC"
+
+    conn = _connect()
+    total = conn.execute("SELECT COUNT(*) FROM scans WHERE user_id = ?", (user_id,)).fetchone()[0]
+    rows = conn.execute(
+        "SELECT scan_id, status, created_at, model_name, attack_type, results_count, progress "
+        f"FROM scans WHERE user_id = ? ORDER BY {sort_by} {direction}, scan_id LIMIT ? OFFSET ?",
+        (user_id, limit, offset),
+    ).fetchall()
+
+    summaries = [
+        {
+            "scan_id": row["scan_id"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "results_count": row["results_count"],
+            "model_name": row["model_name"],
+            "attack_type": row["attack_type"],
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+        }
+        for row in rows
+    ]
+    return summaries, total
+
+
+def _owned_rows(rows) -> list:
+    return [
+        (row["user_id"], row["scan_id"], json.loads(row["owner"]) if row["owner"] else None)
+        for row in rows
+    ]
+
+
+def find_scans_by_status(statuses) -> list:
+    """Return (user_id, scan_id, owner) for every scan in one of the given states"""
+    statuses = list(statuses)
+    placeholders = ", ".join("?" for _ in statuses)
+    rows = _connect().execute(
+        f"SELECT user_id, scan_id, json_extract(data, '$.owner') AS owner FROM scans WHERE status IN ({placeholders})",
+        statuses,
+    ).fetchall()
+    return _owned_rows(rows)
+
+
+def find_scans_with_pending_report() -> list:
+    """Return (user_id, scan_id, owner) for completed scans still waiting on their report"""
+    rows = _connect().execute(
+        "SELECT user_id, scan_id, json_extract(data, '$.owner') AS owner FROM scans "
+        "WHERE status = 'completed' AND json_extract(data, '$.report_status') = 'pending'"
+    ).fetchall()
+    return _owned_rows(rows)
+
+
+@time_stage("scan_store_write")
+def claim_scan(user_id: str, scan_id: str, owner: dict, previous_owner) -> bool:
+    """
+    Make `owner` the scan's owner if it is still `previous_owner`; returns
+    False when another process claimed it first.
+    """
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT data FROM scans WHERE scan_id = ? AND user_id = ?", (scan_id, user_id)
+        ).fetchone()
+        scan_data = json.loads(row["data"]) if row else None
+        if scan_data is None or scan_data.get("owner") != previous_owner:
+            conn.execute("ROLLBACK")
+            return False
+        scan_data["owner"] = owner
+        _upsert(conn, user_id, scan_id, scan_data)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+
+def get_cached_report(digest: str):
+    """Return a previously generated report for a result digest, or None"""
+    row = _connect().execute(
+        "SELECT report FROM report_cache WHERE digest = ?", (digest,)
+    ).fetchone()
+    return row["report"] if row else None
+
+
+def save_cached_report(digest: str, report: str):
+    """Remember a generated report under its result digest"""
+    _connect().execute(
+        "INSERT OR REPLACE INTO report_cache (digest, report, created_at) VALUES (?, ?, ?)",
+        (digest, report, datetime.now().isoformat()),
+    )
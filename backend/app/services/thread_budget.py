@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+
+
+class ThreadBudget:
+    """
+    Shares a fixed number of torch intra-op threads among the attack jobs
+    running in every worker process.
+
+    The count of running jobs lives in shared memory. Each job takes its fair
+    share when it starts and re-reads it at batch boundaries. Cores are
+    rebalanced as jobs start and finish, without fixed per-worker pools that
+    leave cores idle or oversubscribe them.
+    """
+
+    def __init__(self, total_threads: int, active_jobs):
+        """active_jobs: a multiprocessing Value('i') shared by all workers"""
+        self.total_threads = max(1, total_threads)
+        self._active_jobs = active_jobs
+
+    def share(self) -> int:
+        """Threads each running job should use right now"""
+        return max(1, self.total_threads // max(1, self._active_jobs.value))
+
+    def apply(self) -> int:
+        """Resize this process's torch thread pool to the current share"""
+        import torch
+
+        threads = self.share()
+        if torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+        return threads
+
+    @contextmanager
+    def job(self):
+        """Count a job as running for its duration; yields a ThreadUsage"""
+        with self._active_jobs.get_lock():
+            self._active_jobs.value += 1
+        try:
+            usage = ThreadUsage(self)
+            usage.rebalance()
+            yield usage
+        finally:
+            with self._active_jobs.get_lock():
+                self._active_jobs.value -= 1
+
+
+class ThreadUsage:
+    """Threads one job was given over its lifetime, for the scan record"""
+
+    def __init__(self, budget: ThreadBudget):
+        self._budget = budget
+        self.allocations = []
+
+    def rebalance(self) -> int:
+        threads = self._budget.apply()
+        self.allocations.append(threads)
+        return threads
+
+    def summary(self) -> dict:
+        return {
+            "total_threads": self._budget.total_threads,
+            "start": self.allocations[0],
+            "min": min(self.allocations),
+            "max": max(self.allocations),
+        }
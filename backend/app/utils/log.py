@@ -0,0 +1,144 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from app.config import LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_EVERY
+
+# Fields set by log_context() and added to every record logged inside it
+_context = ContextVar("log_context", default={})
+
+# LogRecord attributes that are not structured fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sampled"}
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields such as scan_id and user_id to every record logged in this context"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the active log_context() fields onto the record"""
+
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps 1 in `every` records logged with extra={"sampled": True} below
+    WARNING, counted per call site; warnings and errors always pass.
+    """
+
+    def __init__(self, every: int = LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.every:
+            return False
+        record.sample_rate = 1 / self.every
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and structured fields"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with the structured fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RESERVED)
+        return f"{line} {fields}" if fields else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records without formatting them; the listener thread does the I/O and formatting"""
+
+    def prepare(self, record):
+        # Resolve what can't cross threads safely: args and the live traceback
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """
+    Route the root logger through a queue to a background thread writing to
+    stderr, so logging calls never block on I/O. Safe to call more than once.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        log_queue = queue.SimpleQueue()
+        handler = _QueueHandler(log_queue)
+        handler.addFilter(ContextFilter())
+        handler.addFilter(SamplingFilter())
+
+        output = logging.StreamHandler()
+        output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
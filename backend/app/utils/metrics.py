@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the latency histogram buckets; stages range from
+# sub-millisecond cache lookups to multi-minute attacks
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+logger = logging.getLogger(__name__)
+
+# Samples recorded while a collect_timings() block is active, as (stage, attack_type, seconds)
+_current_samples = ContextVar("stage_timing_samples", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, as Prometheus expects"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = _format_labels(self.labelnames, key)
+                for bound, count in zip(self.buckets, series):
+                    bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf_labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{labels} {series[-2]}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    "vulnai_stage_duration_seconds",
+    "Wall-clock time spent in each pipeline stage",
+    labelnames=("stage", "attack_type"),
+)
+STAGE_ERRORS = Counter(
+    "vulnai_stage_errors_total",
+    "Pipeline stages that raised",
+    labelnames=("stage", "attack_type"),
+)
+SCANS = Counter(
+    "vulnai_scans_total",
+    "Scans that reached a final status",
+    labelnames=("status",),
+)
+
+REGISTRY = (STAGE_DURATION, STAGE_ERRORS, SCANS)
+
+
+def record_stage(stage: str, seconds: float, attack_type: str = ""):
+    """Observe one stage duration, and keep it for the active collect_timings() block"""
+    STAGE_DURATION.observe(seconds, stage=stage, attack_type=attack_type)
+    # Sampled: stages such as image_save run once per image
+    logger.debug("Stage timed", extra={"sampled": True, "stage": stage, "attack_type": attack_type, "duration": seconds})
+    samples = _current_samples.get()
+    if samples is not None:
+        samples.append((stage, attack_type, seconds))
+
+
+@contextmanager
+def time_stage(stage: str, attack_type: str = ""):
+    """Time a block as `stage`; exceptions are counted and re-raised"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage, attack_type=attack_type)
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - start, attack_type)
+
+
+@contextmanager
+def collect_timings():
+    """
+    Collect every stage recorded in this context (and tasks/threads started
+    from it) into a list of (stage, attack_type, seconds) samples.
+    """
+    samples = []
+    token = _current_samples.set(samples)
+    try:
+        yield samples
+    finally:
+        _current_samples.reset(token)
+
+
+def observe_samples(samples: list):
+    """Replay samples recorded in another process into this one"""
+    for stage, attack_type, seconds in samples:
+        record_stage(stage, seconds, attack_type)
+
+
+def summarize_timings(samples: list) -> dict:
+    """Per-stage breakdown for a scan record, keyed "stage" or "stage.attack_type" """
+    summary = {}
+    for stage, attack_type, seconds in samples:
+        key = f"{stage}.{attack_type}" if attack_type else stage
+        entry = summary.setdefault(key, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        entry["count"] += 1
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+    for entry in summary.values():
+        entry["total_seconds"] = round(entry["total_seconds"], 4)
+        entry["max_seconds"] = round(entry["max_seconds"], 4)
+    return dict(sorted(summary.items()))
+
+
+def render_metrics() -> str:
+    """The registry in Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
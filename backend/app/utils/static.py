@@ -0,0 +1,52 @@
+import os
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+
+from app.config import STATIC_CACHE_MAX_AGE_SECONDS
+
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={STATIC_CACHE_MAX_AGE_SECONDS}, immutable"
+# Files that may be replaced in place are revalidated against their ETag instead
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Upload names that are unique per file (test_<uuid>.<ext>); model checkpoints are overwritten on re-upload
+IMMUTABLE_UPLOAD_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp")
+
+
+def cache_control_for(path: str, immutable_suffixes: tuple = None) -> str:
+    if immutable_suffixes is None or path.lower().endswith(immutable_suffixes):
+        return IMMUTABLE_CACHE_CONTROL
+    return REVALIDATE_CACHE_CONTROL
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles that marks content-named files as immutable.
+
+    ETag/Last-Modified and 304 handling come from StaticFiles. With
+    immutable_suffixes, only matching files are immutable; others revalidate.
+    """
+
+    def __init__(self, *args, immutable_suffixes: tuple = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable_suffixes = immutable_suffixes
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Cache-Control"] = cache_control_for(str(full_path), self.immutable_suffixes)
+        return response
+
+
+def cached_file_response(request: Request, path: str) -> Response:
+    """FileResponse with the same caching headers and conditional handling as CachedStaticFiles"""
+    response = FileResponse(path, stat_result=os.stat(path))
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    if_none_match = request.headers.get("if-none-match")
+    etag = response.headers["etag"].strip('"')
+    if if_none_match and etag in [tag.strip(' W/"') for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={
+            key: value for key, value in response.headers.items()
+            if key in ("cache-control", "etag", "last-modified")
+        })
+    return response
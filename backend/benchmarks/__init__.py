@@ -0,0 +1,10 @@
+"""
+Offline performance benchmarks for the attack pipeline.
+
+Everything runs against random-weight models and synthetic images inside a
+throwaway working directory, so no network, uploads or real data are needed.
+Run from the backend directory:
+
+    python -m benchmarks.pipeline --models tiny resnet --images 32 --output baseline.json
+    python -m benchmarks.pipeline --compare baseline.json
+"""
@@ -0,0 +1,118 @@
+import json
+import os
+import platform
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# Bump when stage names or measurement methods change, so old baselines aren't compared blindly
+BASELINE_VERSION = 1
+
+
+class StageTimer:
+    """Collects wall-clock samples per stage and the number of items each covered"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.items = defaultdict(int)
+
+    @contextmanager
+    def time(self, stage: str, items: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, items)
+
+    def record(self, stage: str, seconds: float, items: int = 1):
+        """Add a sample measured elsewhere, e.g. in a subprocess"""
+        self.samples[stage].append(seconds)
+        self.items[stage] += items
+
+    def summary(self) -> dict:
+        """Per-stage count, total, mean, p50/p95 latency (seconds) and items/sec"""
+        stages = {}
+        for stage, samples in self.samples.items():
+            seconds = np.asarray(samples)
+            total = float(seconds.sum())
+            stages[stage] = {
+                "samples": len(samples),
+                "items": self.items[stage],
+                "total_seconds": round(total, 6),
+                "mean_seconds": round(float(seconds.mean()), 6),
+                "p50_seconds": round(float(np.percentile(seconds, 50)), 6),
+                "p95_seconds": round(float(np.percentile(seconds, 95)), 6),
+                "items_per_second": round(self.items[stage] / total, 3) if total > 0 else None,
+            }
+        return stages
+
+
+def environment() -> dict:
+    """Versions and hardware that affect the numbers"""
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    try:
+        import torch
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+def build_baseline(config: dict, results: dict) -> dict:
+    return {
+        "version": BASELINE_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "environment": environment(),
+        "config": config,
+        "results": results,
+    }
+
+
+def save_baseline(baseline: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+
+
+def load_baseline(path: str) -> dict:
+    with open(path, "r") as f:
+        baseline = json.load(f)
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(f"{path} is baseline version {baseline.get('version')}, expected {BASELINE_VERSION}")
+    return baseline
+
+
+def compare(baseline: dict, current: dict, metric: str = "p50_seconds", threshold: float = 0.10) -> list:
+    """
+    Compare two baselines stage by stage.
+
+    Returns one row per (model, stage) present in both: (model, stage, old,
+    new, relative change, regressed), where regressed means `metric` grew by
+    more than `threshold`.
+    """
+    rows = []
+    for model, stages in current["results"].items():
+        for stage, stats in stages.items():
+            old = baseline["results"].get(model, {}).get(stage, {}).get(metric)
+            new = stats.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old > 0 else 0.0
+            rows.append((model, stage, old, new, change, change > threshold))
+    return rows
+
+
+def format_comparison(rows: list, metric: str) -> str:
+    lines = [f"{'model':<8} {'stage':<28} {'old ' + metric:>16} {'new ' + metric:>16} {'change':>8}"]
+    for model, stage, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        lines.append(f"{model:<8} {stage:<28} {old:>16.6f} {new:>16.6f} {change:>+8.1%}{flag}")
+    return "\n".join(lines)
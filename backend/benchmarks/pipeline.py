@@ -0,0 +1,195 @@
+"""
+Stage-by-stage benchmark of ModelService and AttackService on synthetic data.
+
+Stages: model upload/ingest, cold and warm model load, image upload,
+preprocess, test tensor load, clean predict, generate per attack, adversarial
+image save and scan store write. Results are written as a JSON baseline and
+can be compared against an earlier one; the exit code is 1 on regression.
+"""
+import argparse
+import asyncio
+import io
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.baseline import (  # noqa: E402
+    StageTimer,
+    build_baseline,
+    save_baseline,
+    load_baseline,
+    compare,
+    format_comparison,
+)
+from benchmarks.synthetic import MODEL_SIZES, model_checkpoint_bytes, image_png_bytes  # noqa: E402
+
+BENCH_USER = "benchmark"
+DEFAULT_ATTACKS = ("fgsm", "pgd", "c_and_w", "deepfool")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", choices=MODEL_SIZES, default=["tiny"])
+    parser.add_argument("--attacks", nargs="+", default=list(DEFAULT_ATTACKS))
+    parser.add_argument("--images", type=int, default=32, help="number of synthetic test images")
+    parser.add_argument("--nb-classes", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=None, help="defaults to ATTACK_BATCH_SIZE")
+    parser.add_argument("--max-iter", type=int, default=None,
+                        help="override max_iter of iterative attacks for quicker runs")
+    parser.add_argument("--output", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--metric", default="p50_seconds", choices=("p50_seconds", "p95_seconds", "mean_seconds"))
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown counted as a regression")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the scratch directory for inspection")
+    return parser.parse_args(argv)
+
+
+def _upload(data: bytes, filename: str):
+    from fastapi import UploadFile
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+def upload_images(timer: StageTimer, count: int):
+    from app.services.model_service import ModelService
+
+    model_service = ModelService()
+    for i in range(count):
+        data = image_png_bytes(seed=i)
+        with timer.time("image_upload"):
+            asyncio.run(model_service.save_test_image(_upload(data, f"synthetic_{i}.png"), BENCH_USER))
+
+
+def benchmark_model(size: str, args) -> dict:
+    """Time every pipeline stage for one synthetic model; returns the stage summary"""
+    from app.config import ATTACK_BATCH_SIZE
+    from app.services.model_cache import model_cache
+    from app.services.model_service import ModelService
+    from app.services.attack_service import AttackService
+    from app.services.image_writer import write_png
+    from app.services.scan_store import save_scan_to_disk, append_scan_results
+
+    timer = StageTimer()
+    model_service = ModelService()
+    attack_service = AttackService()
+    batch_size = args.batch_size or ATTACK_BATCH_SIZE
+    model_name = f"synthetic_{size}"
+
+    checkpoint = model_checkpoint_bytes(size, args.nb_classes)
+    with timer.time("model_upload_ingest"):
+        asyncio.run(model_service.save_model(_upload(checkpoint, f"{model_name}.pt"), model_name, args.nb_classes, BENCH_USER))
+
+    model_cache.clear()
+    with timer.time("model_load_cold"):
+        model, metadata = model_service.load_model(model_name, BENCH_USER)
+    with timer.time("model_load_warm"):
+        model_service.load_model(model_name, BENCH_USER)
+
+    for image_path in model_service.get_user_images(BENCH_USER):
+        with timer.time("preprocess"):
+            model_service.preprocess_image(image_path)
+
+    with timer.time("load_test_tensors", items=args.images):
+        image_paths, _, images_np = model_service.load_test_tensors(BENCH_USER, args.images)
+    images_np = images_np[:len(image_paths)]
+
+    classifier = attack_service._create_classifier(model, args.nb_classes)
+    batches = [slice(start, start + batch_size) for start in range(0, len(image_paths), batch_size)]
+    for batch in batches:
+        with timer.time("clean_predict", items=len(image_paths[batch])):
+            classifier.predict(images_np[batch], batch_size=batch_size)
+
+    results_dir = os.path.join("results", BENCH_USER)
+    os.makedirs(results_dir, exist_ok=True)
+    scan_id = str(uuid.uuid4())
+    save_scan_to_disk(BENCH_USER, scan_id, {"scan_id": scan_id, "status": "running", "model_name": model_name})
+
+    for attack_name in args.attacks:
+        attack_class, params = attack_service.ATTACKS[attack_name]
+        params = dict(params, batch_size=batch_size)
+        if args.max_iter is not None and "max_iter" in attack_class.attack_params:
+            params["max_iter"] = args.max_iter
+        attack = attack_class(classifier, **params)
+
+        for batch in batches:
+            x = images_np[batch]
+            with timer.time(f"generate_{attack_name}", items=len(x)):
+                adversarial = attack.generate(x=x)
+            for i, adversarial_image in enumerate(adversarial):
+                with timer.time("image_save"):
+                    write_png(adversarial_image, os.path.join(results_dir, f"{attack_name}_{scan_id}_{batch.start + i}.png"))
+            rows = [
+                {"attack_type": attack_name, "original_image_path": path, "attack_success": False}
+                for path in image_paths[batch]
+            ]
+            with timer.time("scan_store_write", items=len(rows)):
+                append_scan_results(BENCH_USER, scan_id, rows)
+
+    return timer.summary()
+
+
+def print_summary(results: dict):
+    for size, stages in results.items():
+        print(f"\n== {size} ==")
+        print(f"{'stage':<28} {'n':>5} {'p50 s':>10} {'p95 s':>10} {'items/s':>10}")
+        for stage, stats in sorted(stages.items()):
+            rate = stats["items_per_second"]
+            print(f"{stage:<28} {stats['samples']:>5} {stats['p50_seconds']:>10.4f} "
+                  f"{stats['p95_seconds']:>10.4f} {rate if rate is not None else '-':>10}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    output = os.path.abspath(args.output) if args.output else None
+    previous = load_baseline(os.path.abspath(args.compare)) if args.compare else None
+
+    # Services use relative paths; run in a scratch directory and keep caches out of the timings
+    workdir = tempfile.mkdtemp(prefix="vulnai-bench-")
+    original_cwd = os.getcwd()
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    os.chdir(workdir)
+    try:
+        from app.services.attack_service import AttackService
+        unknown = sorted(set(args.attacks) - set(AttackService().ATTACKS))
+        if unknown:
+            print(f"Unknown attacks: {', '.join(unknown)}")
+            return 2
+
+        images_timer = StageTimer()
+        upload_images(images_timer, args.images)
+        results = {}
+        for size in args.models:
+            print(f"Benchmarking {size} model on {args.images} images...")
+            results[size] = {**images_timer.summary(), **benchmark_model(size, args)}
+    finally:
+        os.chdir(original_cwd)
+        if args.keep_workdir:
+            print(f"Scratch directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "metric", "threshold", "keep_workdir")}
+    current = build_baseline(config, results)
+    print_summary(results)
+
+    if output:
+        save_baseline(current, output)
+        print(f"\nBaseline written to {output}")
+
+    if previous is not None:
+        if previous["config"] != config:
+            print("\nWarning: the baseline was recorded with a different configuration")
+        rows = compare(previous, current, metric=args.metric, threshold=args.threshold)
+        print("\n" + format_comparison(rows, args.metric))
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,352 @@
+"""
+End-to-end regression checks for the scan pipeline on synthetic data.
+
+Each check runs real services in a scratch directory and prints PASS or
+FAIL with the reason; the exit code is 1 when any check fails. The report
+checks stand in a fake LLM client for Gemini and the auth checks a local
+token issuer for Google, so they need no network.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.pipeline import BENCH_USER, DEFAULT_ATTACKS, _upload  # noqa: E402
+from benchmarks.synthetic import model_checkpoint_bytes, image_png_bytes  # noqa: E402
+
+MODEL_NAME = "synthetic_tiny"
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def _expect(condition: bool, message: str):
+    if not condition:
+        raise CheckFailed(message)
+
+
+class FakeLLMClient:
+    """
+    Stand-in for the Gemini client: each call sleeps `delay` seconds, the first
+    `failures` calls raise, later ones answer with a numbered narrative.
+    """
+
+    def __init__(self, failures: int = 0, delay: float = 0.0):
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+        self.models = self
+
+    def generate_content(self, model, contents):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.calls <= self.failures:
+            raise ConnectionError(f"fake outage on call {self.calls}")
+        return types.SimpleNamespace(text=f"Fake narrative from call {self.calls}")
+
+
+def _report_scan(args) -> dict:
+    """Scan record with synthetic results; the model name is unique so the narrative cache starts cold"""
+    results = [
+        {
+            "attack_type": "fgsm", "original_image_path": f"synthetic_{i}.png", "adversarial_image_path": "",
+            "original_prediction": f"Class {i % 3}", "adversarial_prediction": f"Class {(i + i % 2) % 3}",
+            "confidence_original": 0.9, "confidence_adversarial": 0.5, "perturbation_norm": 0.1 * (i + 1),
+            "attack_success": i % 2 == 1,
+        }
+        for i in range(args.images)
+    ]
+    return {"scan_id": str(uuid.uuid4()), "status": "completed", "model_name": f"report_{uuid.uuid4().hex[:8]}",
+            "results": results}
+
+
+def check_report_narrative_cache(args):
+    """A second report of the same summary reuses the cached narrative instead of calling the LLM"""
+    from app.services.reporter_service import ReporterService
+
+    client = FakeLLMClient()
+    reporter = ReporterService(client=client, use_llm=True)
+    scan = _report_scan(args)
+    first = asyncio.run(reporter.generate_security_report(scan))
+    second = asyncio.run(reporter.generate_security_report(scan))
+    _expect(client.calls == 1, f"LLM called {client.calls} times for two reports of one summary")
+    _expect("Fake narrative from call 1" in first and "Fake narrative from call 1" in second,
+            "cached narrative missing from the report")
+
+
+def check_report_retry(args):
+    """Failed LLM calls are retried, and a later success ends up in the report"""
+    from app.services.reporter_service import ReporterService
+
+    client = FakeLLMClient(failures=2)
+    reporter = ReporterService(client=client, use_llm=True, max_retries=3, retry_backoff_seconds=0.01)
+    report = asyncio.run(reporter.generate_security_report(_report_scan(args)))
+    _expect(client.calls == 3, f"expected 3 LLM calls (2 failures, 1 success), got {client.calls}")
+    _expect("Fake narrative from call 3" in report, "narrative from the successful retry missing")
+
+
+def check_report_timeout_fallback(args):
+    """When every LLM call times out, the local report is still produced and says the narrative is missing"""
+    from app.services.reporter_service import ReporterService
+
+    client = FakeLLMClient(delay=0.5)
+    reporter = ReporterService(client=client, use_llm=True, timeout_seconds=0.05, max_retries=2,
+                               retry_backoff_seconds=0.01)
+    report = asyncio.run(reporter.generate_security_report(_report_scan(args)))
+    _expect(client.calls == 2, f"expected 2 timed-out LLM calls, got {client.calls}")
+    _expect("Narrative unavailable" in report, "report doesn't note the missing narrative")
+    _expect("## 2. Attack Analysis" in report, "local report sections missing")
+
+
+def check_scheduler_report(args):
+    """The scheduler generates and stores a scan's report through an injected reporter"""
+    from app.services.reporter_service import ReporterService
+    from app.services.scan_scheduler import ScanScheduler, REPORT_READY
+    from app.services.scan_store import save_scan_to_disk, append_scan_results, get_scan_from_disk
+
+    scan = _report_scan(args)
+    results = scan.pop("results")
+    save_scan_to_disk(BENCH_USER, scan["scan_id"], scan)
+    append_scan_results(BENCH_USER, scan["scan_id"], results)
+
+    client = FakeLLMClient()
+    scheduler = ScanScheduler(reporter=ReporterService(client=client, use_llm=True))
+    asyncio.run(scheduler._generate_report(scan["scan_id"], BENCH_USER))
+    stored = get_scan_from_disk(BENCH_USER, scan["scan_id"], include_results=False)
+    _expect(stored.get("report_status") == REPORT_READY,
+            f"report_status is {stored.get('report_status')}: {stored.get('report_error')}")
+    _expect("Fake narrative from call 1" in stored.get("full_report_markdown", ""),
+            "stored report lacks the injected client's narrative")
+
+
+class StubCertSession:
+    """Stand-in for requests.Session serving a local issuer's certs with the given cache headers"""
+
+    def __init__(self, certs: dict, headers: dict):
+        self.certs = certs
+        self.headers = headers
+        self.calls = 0
+
+    def get(self, url, timeout=None):
+        self.calls += 1
+        return types.SimpleNamespace(status_code=200, headers=dict(self.headers), json=lambda: dict(self.certs))
+
+
+def _local_issuer_key(key_id: str):
+    """(RSA signer, self-signed PEM cert) for a local token issuer"""
+    import datetime
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+    from google.auth import crypt
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "local-issuer.test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1)).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    signer = crypt.RSASigner.from_string(private_pem, key_id=key_id)
+    return signer, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def check_local_issuer_certs(args):
+    """Cert caching honors max-age minus Age, refetches for a rotated key id, and verifies tokens"""
+    from google.auth import jwt as google_jwt
+    from app.services.auth_cache import CertCache, cache_lifetime
+
+    _expect(cache_lifetime({"Cache-Control": "public, max-age=100", "Age": "40"}, 300) == 60,
+            "lifetime should be max-age minus Age")
+    _expect(cache_lifetime({"Cache-Control": "no-store, max-age=100"}, 300) == 0, "no-store should not be cached")
+    _expect(cache_lifetime({}, 300) == 300, "responses without max-age should use the default TTL")
+
+    old_signer, old_cert = _local_issuer_key("old")
+    new_signer, new_cert = _local_issuer_key("new")
+    session = StubCertSession({"old": old_cert}, {"Cache-Control": "public, max-age=100", "Age": "40"})
+    certs = CertCache(url="https://local-issuer.test/certs", session=session, min_refresh_interval=0)
+
+    certs.get("old")
+    certs.get("old")
+    _expect(session.calls == 1, f"fresh certs were fetched {session.calls} times")
+
+    # Age past max-age: the response is already stale, so every lookup refetches
+    session.headers = {"Cache-Control": "public, max-age=100", "Age": "150"}
+    certs.clear()
+    certs.get("old")
+    certs.get("old")
+    _expect(session.calls == 3, f"stale certs were fetched {session.calls - 1} times for two lookups, expected 2")
+
+    # Key rotation: a token signed with a key id the cache hasn't seen forces a refetch
+    session.headers = {"Cache-Control": "public, max-age=3600"}
+    certs.clear()
+    certs.get("old")
+    # The issuer starts signing with a new key
+    session.certs = {"old": old_cert, "new": new_cert}
+    calls = session.calls
+    audience = "local-client-id"
+    now = int(time.time())
+    token = google_jwt.encode(new_signer, {
+        "iss": "https://local-issuer.test", "aud": audience, "sub": "local-user", "iat": now, "exp": now + 300,
+    })
+    claims = google_jwt.decode(token, certs=certs.get("new"), audience=audience)
+    _expect(session.calls == calls + 1, "an unknown key id did not trigger a refetch")
+    _expect(claims["sub"] == "local-user", f"verified claims are wrong: {claims}")
+
+    # Within the refresh interval an unknown key id must not refetch on every request
+    throttled = CertCache(url="https://local-issuer.test/certs", session=session)
+    throttled.get("old")
+    calls = session.calls
+    throttled.get("unknown")
+    _expect(session.calls == calls, "unknown key ids refetched inside the minimum refresh interval")
+
+    old_token = google_jwt.encode(old_signer, {
+        "iss": "https://local-issuer.test", "aud": audience, "sub": "old-user", "iat": now, "exp": now + 300,
+    })
+    _expect(google_jwt.decode(old_token, certs=certs.get("old"), audience=audience)["sub"] == "old-user",
+            "token signed with the old key no longer verifies")
+
+
+def check_token_payload_expiry(args):
+    """Cached access-token payloads are served until their exp, then dropped"""
+    from app.services.auth_cache import TokenPayloadCache
+
+    payloads = TokenPayloadCache(max_entries=2)
+    payloads.put("short", {"user_id": "a", "exp": time.time() + 0.3})
+    payloads.put("no-exp", {"user_id": "b"})
+    cached = payloads.get("short")
+    _expect(cached is not None and cached["user_id"] == "a", "payload was not cached before its exp")
+    cached["user_id"] = "tampered"
+    _expect(payloads.get("short")["user_id"] == "a", "callers can modify the cached payload")
+    _expect(payloads.get("no-exp") is None, "a payload without exp was cached")
+    time.sleep(0.4)
+    _expect(payloads.get("short") is None, "payload was served after its exp")
+
+
+def check_rescan_uses_cache(args):
+    """A second scan of the same model and images is served from the result cache"""
+    from app.services.model_service import ModelService
+    from app.services.attack_service import AttackService
+    from app.services.result_cache import AttackResultCache
+
+    model_service = ModelService()
+    asyncio.run(model_service.save_model(
+        _upload(model_checkpoint_bytes("tiny", args.nb_classes), f"{MODEL_NAME}.pt"), MODEL_NAME, args.nb_classes, BENCH_USER
+    ))
+    for i in range(args.images):
+        asyncio.run(model_service.save_test_image(_upload(image_png_bytes(seed=i), f"synthetic_{i}.png"), BENCH_USER))
+
+    attack_service = AttackService()
+    # Regardless of RESULT_CACHE_ENABLED in the environment
+    attack_service.result_cache = AttackResultCache(enabled=True)
+    for attack_name in args.attacks:
+        first, first_status = attack_service.run_attack(attack_name, MODEL_NAME, str(uuid.uuid4()), BENCH_USER)
+        second, second_status = attack_service.run_attack(attack_name, MODEL_NAME, str(uuid.uuid4()), BENCH_USER)
+
+        _expect(first_status["status"] == "completed", f"{attack_name} first scan: {first_status.get('error')}")
+        _expect(second_status["status"] == "completed", f"{attack_name} rescan: {second_status.get('error')}")
+        _expect(len(second) == len(first) == args.images,
+                f"{attack_name}: {len(first)} then {len(second)} results for {args.images} images")
+        _expect(second_status["images_cached"] == args.images,
+                f"{attack_name}: rescan served {second_status['images_cached']}/{args.images} from the cache")
+        for before, after in zip(first, second):
+            _expect(
+                (before.adversarial_class, before.attack_success) == (after.adversarial_class, after.attack_success),
+                f"{attack_name}: cached result for {after.original_image_path} differs from the computed one",
+            )
+
+
+def check_event_replay(args):
+    """GET /scan/{id}/events replays stored results, then the terminal status"""
+    from app.routers.upload import stream_scan_events
+    from app.services.scan_store import save_scan_to_disk, append_scan_results
+
+    scan_id = str(uuid.uuid4())
+    save_scan_to_disk(BENCH_USER, scan_id, {"scan_id": scan_id, "status": "completed", "model_name": MODEL_NAME})
+    results = [
+        {"attack_type": "fgsm", "original_image_path": f"synthetic_{i}.png", "attack_success": i % 2 == 0}
+        for i in range(args.images)
+    ]
+    append_scan_results(BENCH_USER, scan_id, results)
+
+    async def read_stream():
+        response = await stream_scan_events(scan_id, current_user={"user_id": BENCH_USER})
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(read_stream())
+    events = [line.split(": ", 1)[1] for chunk in chunks for line in chunk.splitlines() if line.startswith("event: ")]
+    _expect(events.count("result") == args.images,
+            f"replayed {events.count('result')} of {args.images} stored results (events: {events})")
+    _expect(events[-1:] == ["completed"], f"stream did not end with the scan status (events: {events})")
+
+
+CHECKS = {
+    "rescan_cache": check_rescan_uses_cache,
+    "event_replay": check_event_replay,
+    "report_cache": check_report_narrative_cache,
+    "report_retry": check_report_retry,
+    "report_timeout": check_report_timeout_fallback,
+    "scheduler_report": check_scheduler_report,
+    "local_issuer_certs": check_local_issuer_certs,
+    "token_payload_expiry": check_token_payload_expiry,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("checks", nargs="*", help=f"checks to run: {', '.join(CHECKS)} (default: all)")
+    parser.add_argument("--attacks", nargs="+", default=list(DEFAULT_ATTACKS))
+    parser.add_argument("--images", type=int, default=4, help="number of synthetic test images")
+    parser.add_argument("--nb-classes", type=int, default=10)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    names = args.checks or list(CHECKS)
+    unknown = sorted(set(names) - set(CHECKS))
+    if unknown:
+        print(f"Unknown checks: {', '.join(unknown)}")
+        return 2
+
+    failed = 0
+    # Services use relative paths, and the scan store keeps its connection open
+    # for the process, so every check runs in one scratch directory
+    workdir = tempfile.mkdtemp(prefix="vulnai-smoke-")
+    original_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for name in names:
+            try:
+                CHECKS[name](args)
+                print(f"PASS {name}")
+            except CheckFailed as e:
+                failed += 1
+                print(f"FAIL {name}: {e}")
+            except Exception as e:
+                failed += 1
+                print(f"FAIL {name}: {type(e).__name__}: {e}")
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Import time and memory of the API process, measured in fresh interpreters.
+
+Each run imports app.main in a new subprocess and records the import time,
+peak RSS and whether any of the heavy ML modules (torch, torchvision, ART,
+google-genai) got loaded; those must only load on the first scan. Results can
+be written as a JSON baseline and compared against an earlier one; the exit
+code is 1 when a heavy module is imported at startup, the RSS limit is
+exceeded or import time regresses.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.baseline import (  # noqa: E402
+    StageTimer,
+    build_baseline,
+    save_baseline,
+    load_baseline,
+    compare,
+    format_comparison,
+)
+
+# Modules the API must not import until a scan or report needs them
+HEAVY_MODULES = ("torch", "torchvision", "art", "google.genai")
+
+# Entry points timed separately: the whole app, and the auth path on its own
+TARGETS = {
+    "import_app_main": "app.main",
+    "import_auth": "app.routers.auth_router",
+}
+
+# Prefix of the probe's output line, so other output from the import is ignored
+_PROBE_MARKER = "startup-probe: "
+
+# Runs in the subprocess; prints one marked JSON line with the measurements
+_PROBE = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(sys.argv[2] + json.dumps({
+    "seconds": seconds,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_modules": [name for name in sys.argv[3:] if name in sys.modules],
+}))
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--max-rss-mb", type=float, default=None, help="fail when app.main peaks above this")
+    parser.add_argument("--output", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--metric", default="p50_seconds", choices=("p50_seconds", "p95_seconds", "mean_seconds"))
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown counted as a regression")
+    return parser.parse_args(argv)
+
+
+def measure_import(module: str, workdir: str) -> dict:
+    """Import `module` in a fresh interpreter and return its measurements"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")])))
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE, module, _PROBE_MARKER, *HEAVY_MODULES],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True,
+    )
+    line = next(line for line in completed.stdout.splitlines() if line.startswith(_PROBE_MARKER))
+    return json.loads(line[len(_PROBE_MARKER):])
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    output = os.path.abspath(args.output) if args.output else None
+    previous = load_baseline(os.path.abspath(args.compare)) if args.compare else None
+
+    timer = StageTimer()
+    peak_rss_mb = {}
+    heavy = {}
+    # app.main creates its upload/result directories in the working directory
+    with tempfile.TemporaryDirectory(prefix="vulnai-startup-") as workdir:
+        for stage, module in TARGETS.items():
+            for _ in range(args.runs):
+                sample = measure_import(module, workdir)
+                timer.record(stage, sample["seconds"])
+                peak_rss_mb[stage] = max(peak_rss_mb.get(stage, 0.0), sample["max_rss_kb"] / 1024)
+                heavy.setdefault(stage, set()).update(sample["heavy_modules"])
+
+    stages = timer.summary()
+    for stage, stats in stages.items():
+        stats["peak_rss_mb"] = round(peak_rss_mb[stage], 1)
+        stats["heavy_modules"] = sorted(heavy[stage])
+
+    print(f"{'target':<20} {'p50 s':>8} {'p95 s':>8} {'peak RSS MB':>12}  heavy modules")
+    for stage, stats in stages.items():
+        print(f"{stage:<20} {stats['p50_seconds']:>8.3f} {stats['p95_seconds']:>8.3f} "
+              f"{stats['peak_rss_mb']:>12.1f}  {', '.join(stats['heavy_modules']) or '-'}")
+
+    config = {"runs": args.runs}
+    current = build_baseline(config, {"startup": stages})
+    if output:
+        save_baseline(current, output)
+        print(f"\nBaseline written to {output}")
+
+    failed = False
+    for stage, stats in stages.items():
+        if stats["heavy_modules"]:
+            print(f"\n{stage} imports {', '.join(stats['heavy_modules'])} at startup")
+            failed = True
+    if args.max_rss_mb is not None and stages["import_app_main"]["peak_rss_mb"] > args.max_rss_mb:
+        print(f"\napp.main peaks at {stages['import_app_main']['peak_rss_mb']} MB RSS, limit {args.max_rss_mb} MB")
+        failed = True
+
+    if previous is not None:
+        rows = compare(previous, current, metric=args.metric, threshold=args.threshold)
+        print("\n" + format_comparison(rows, args.metric))
+        failed = failed or any(row[-1] for row in rows)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
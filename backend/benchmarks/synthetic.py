@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# Model sizes the suite can generate
+MODEL_SIZES = ("tiny", "resnet")
+
+
+def build_model(size: str, nb_classes: int):
+    """Random-weight classifier taking (N, 3, 224, 224) input"""
+    import torch
+    import torchvision
+
+    torch.manual_seed(0)
+    if size == "tiny":
+        model = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 8, kernel_size=3, stride=4, padding=1),
+            torch.nn.ReLU(),
+            torch.nn.AdaptiveAvgPool2d(1),
+            torch.nn.Flatten(),
+            torch.nn.Linear(8, nb_classes),
+        )
+    elif size == "resnet":
+        # ResNet-18 architecture without downloading pretrained weights
+        model = torchvision.models.resnet18(weights=None, num_classes=nb_classes)
+    else:
+        raise ValueError(f"Unknown model size '{size}'. Choose one of: {', '.join(MODEL_SIZES)}")
+    return model.eval()
+
+
+def model_checkpoint_bytes(size: str, nb_classes: int) -> bytes:
+    """A pickled full-model checkpoint, as users upload them"""
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(build_model(size, nb_classes), buffer)
+    return buffer.getvalue()
+
+
+def image_png_bytes(seed: int, size: tuple = (256, 256)) -> bytes:
+    """A deterministic noise image; larger than 224 so preprocessing resizes it"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -26,6 +26,7 @@ import {
   uploadTestData, 
   runScan, 
   getScanResults,
+  waitForScan,
   authenticateWithGoogle,
   logout as apiLogout,
 } from "@/lib/api-client"
@@ -313,11 +314,15 @@ if (!user) {
         throw new Error('No scan_id received from backend');
       }
 
-      setUploadProgress(80);
-
-      // Step 4: Retrieve results
+      // Step 4: Wait for the queued scan and retrieve results
       console.log('📊 STEP 4: Retrieving Scan Results');
-      const scanResults = await getScanResults(scanId);
+      const scanResults = await waitForScan(scanId, {
+        onProgress: (progress) => {
+          if (progress?.percent != null) {
+            setUploadProgress(60 + Math.round(progress.percent * 0.4));
+          }
+        },
+      });
       console.log('✅ Results retrieved!');
       
       setUploadProgress(100);
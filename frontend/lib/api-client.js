@@ -103,16 +103,18 @@ export const getUserImages = async () => {
 };
 
 // Scan APIs
-export const runScan = async (modelName, attackType, epsilon) => {
-  const formData = new FormData();
-  formData.append('model_name', modelName);
-  formData.append('attack_type', attackType.toLowerCase());
-  formData.append('epsilon', epsilon.toString());
-
-  const response = await apiClient.post('/scan', formData, {
-    headers: {
-      'Content-Type': 'multipart/form-data',
-    },
+// Queue a scan. Pass an attack type to run just that attack, or omit it to run
+// the preset for `mode` ('smoke' for a fast check, 'deep' for the full audit).
+export const runScan = async (modelName, attackType, epsilon, { mode = 'deep', timeBudgetSeconds } = {}) => {
+  const attacks = attackType
+    ? [{ attack_type: attackType.toLowerCase(), epsilon }]
+    : [];
+
+  const response = await apiClient.post('/scan', {
+    model_name: modelName,
+    attacks,
+    mode,
+    time_budget_seconds: timeBudgetSeconds ?? null,
   });
 
   return response;
@@ -123,6 +125,40 @@ export const getScanResults = async (scanId) => {
   return response.data;
 };
 
+// Poll a queued scan until it completes or fails
+export const waitForScan = async (scanId, { intervalMs = 2000, onProgress } = {}) => {
+  for (;;) {
+    const scan = await getScanResults(scanId);
+    if (onProgress) {
+      onProgress(scan.progress);
+    }
+    if (scan.status === 'completed') {
+      return scan;
+    }
+    if (scan.status === 'failed') {
+      throw new Error(scan.message || 'Scan failed');
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+};
+
+// One page of a scan's adversarial images; each item has a small thumbnail_url for galleries
+export const getScanImages = async (scanId, { limit = 50, offset = 0, attackType } = {}) => {
+  const params = { limit, offset };
+  if (attackType) {
+    params.attack_type = attackType;
+  }
+  const response = await apiClient.get(`/scan/${scanId}/images`, { params });
+  return response.data;
+};
+
+// ASR, norm percentiles and confusion pairs, computed server-side from the scan's result columns
+export const getScanSummary = async (scanId, { attackType } = {}) => {
+  const params = attackType ? { attack_type: attackType } : {};
+  const response = await apiClient.get(`/scan/${scanId}/summary`, { params });
+  return response.data;
+};
+
 export const getUserScans = async () => {
   const response = await apiClient.get('/scans');
   return response.data;